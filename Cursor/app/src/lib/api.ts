@@ -18,6 +18,15 @@ export function generateThreadId(): string {
   return `nextjs_${timestamp}_${random}`;
 }
 
+/**
+ * Generates a request ID sent in the X-Request-ID header.
+ * The API logs and traces it, so a failed request can be found server-side.
+ * @returns Unique request ID in format "nextjs-{random}"
+ */
+export function generateRequestId(): string {
+  return `nextjs-${Math.random().toString(36).substring(2, 14)}`;
+}
+
 /**
  * Sends a message to the AI agent and returns the response
  * 
@@ -29,6 +38,7 @@ export async function sendMessage(
   message: string,
   threadId: string
 ): Promise<ApiResponse | ApiError> {
+  const requestId = generateRequestId();
   try {
     const controller = new AbortController();
     const timeoutId = setTimeout(() => controller.abort(), 30000);
@@ -37,6 +47,7 @@ export async function sendMessage(
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
+        'X-Request-ID': requestId,
       },
       body: JSON.stringify({
         message,
@@ -50,7 +61,7 @@ export async function sendMessage(
     if (!response.ok) {
       const errorData = await response.json().catch(() => ({}));
       return {
-        error: errorData.error || `Error del servidor: ${response.status}`,
+        error: `${errorData.error || `Error del servidor: ${response.status}`} (ID: ${requestId})`,
       };
     }
 
@@ -59,7 +70,7 @@ export async function sendMessage(
   } catch (error) {
     if (error instanceof Error) {
       if (error.name === 'AbortError') {
-        return { error: 'La solicitud tardó demasiado tiempo. Intenta nuevamente.' };
+        return { error: `La solicitud tardó demasiado tiempo. Intenta nuevamente. (ID: ${requestId})` };
       }
       if (error.message.includes('fetch')) {
         return { error: 'No se pudo conectar con el servidor. Verifica tu conexión.' };
@@ -21,6 +21,7 @@ Hay muchas otras formas válidas de implementarlo.
 from dash import Dash, html, dcc, callback, Input, Output, State, ctx
 import dash_bootstrap_components as dbc
 import requests
+import uuid
 from datetime import datetime
 
 # ============================================
@@ -60,20 +61,23 @@ def enviar_mensaje_api(mensaje, thread_id):
         dict: Respuesta de la API con formato {"response": "...", "thread_id": "..."}
               o {"error": "..."} si hay algún error
     """
+    # ID de la petición: aparece en los logs y trazas de la API para rastrear este mensaje
+    request_id = f"dash-{uuid.uuid4().hex[:12]}"
     try:
         response = requests.post(
             f"{API_URL}/chat",
             json={"message": mensaje, "thread_id": thread_id},
+            headers={"X-Request-ID": request_id},
             timeout=30  # 30 segundos porque las respuestas de IA pueden tardar
         )
         response.raise_for_status()
         return response.json()
     except requests.exceptions.Timeout:
-        return {"error": "La solicitud tomó demasiado tiempo. Intenta nuevamente."}
+        return {"error": f"La solicitud tomó demasiado tiempo. Intenta nuevamente. (ID: {request_id})"}
     except requests.exceptions.ConnectionError:
         return {"error": "No se pudo conectar con la API. Verifica que esté corriendo."}
     except Exception as e:
-        return {"error": f"Error: {str(e)}"}
+        return {"error": f"Error: {str(e)} (ID: {request_id})"}
 
 
 def obtener_historial_api(thread_id):
@@ -89,7 +93,11 @@ def obtener_historial_api(thread_id):
         list: Lista de mensajes del historial
     """
     try:
-        response = requests.get(f"{API_URL}/history/{thread_id}", timeout=5)
+        response = requests.get(
+            f"{API_URL}/history/{thread_id}",
+            headers={"X-Request-ID": f"dash-{uuid.uuid4().hex[:12]}"},
+            timeout=5
+        )
         response.raise_for_status()
         data = response.json()
         return data.get("history", [])
@@ -6,13 +6,34 @@ para asegurarte de que la API está funcionando correctamente.
 
 Uso:
     python test_api.py
+
+Modo de carga (mide la capacidad de la API con los mismos endpoints):
+    python test_api.py --load --users 20 --turns 5
+    python test_api.py --load --mode open --rate 2 --users 60 --json carga.json --csv carga.csv
 """
 
+import argparse
+import csv
+import json
 import requests
 import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
 API_URL = "http://localhost:8000"
 
+# Preguntas que envían los usuarios virtuales, en orden, en cada turno
+PREGUNTAS_CARGA = [
+    "Hola, ¿qué tipos de seguros ofrecen?",
+    "¿Cuánto cuesta el seguro de auto?",
+    "¿Qué cubre el seguro de hogar?",
+    "¿El seguro de salud incluye cobertura dental?",
+    "¿Cómo puedo contactarlos?",
+    "¿Tienen seguro de viaje?",
+]
+
 def test_health():
     """Prueba el endpoint /health"""
     print("=" * 60)
@@ -35,7 +56,7 @@ def test_health():
             
     except requests.exceptions.ConnectionError:
         print("❌ Error de conexión")
-        print("   La API no está corriendo en http://localhost:8000")
+        print(f"   La API no está corriendo en {API_URL}")
         print("   Inicia la API con: cd insurance_agent_api/app && python main.py")
         return False
     except Exception as e:
@@ -107,8 +128,191 @@ def test_history():
         return False
 
 
+def percentil(valores, p):
+    """Percentil p (0-100) por rango más cercano."""
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))]
+
+
+class RegistroCarga:
+    """Guarda el resultado de cada request del modo de carga (seguro entre hilos)."""
+    
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.muestras = []
+        self._lock = threading.Lock()
+    
+    def medir(self, sesion, endpoint, metodo, url, usuario, turno, **kwargs):
+        """Hace un request y registra latencia, status y error. Devuelve la respuesta o None."""
+        # El X-Request-ID permite buscar en las trazas de la API los requests lentos del CSV
+        request_id = f"carga-{uuid.uuid4().hex[:12]}"
+        kwargs["headers"] = {**kwargs.get("headers", {}), "X-Request-ID": request_id}
+        t0 = time.perf_counter()
+        respuesta, error = None, ""
+        try:
+            respuesta = sesion.request(metodo, url, **kwargs)
+            if respuesta.status_code != 200:
+                error = f"HTTP {respuesta.status_code}"
+        except requests.exceptions.RequestException as e:
+            error = type(e).__name__
+        muestra = {
+            "endpoint": endpoint,
+            "usuario": usuario,
+            "turno": turno,
+            "inicio_s": round(t0 - self.inicio, 4),
+            "latencia_ms": round((time.perf_counter() - t0) * 1000, 2),
+            "status": respuesta.status_code if respuesta is not None else None,
+            "error": error,
+            "request_id": request_id,
+        }
+        with self._lock:
+            self.muestras.append(muestra)
+        return respuesta if not error else None
+    
+    def resumen(self, duracion):
+        """Estadísticas por endpoint: latencias, throughput y tasa de errores."""
+        por_endpoint = {}
+        for muestra in self.muestras:
+            por_endpoint.setdefault(muestra["endpoint"], []).append(muestra)
+        resumen = {}
+        for endpoint, muestras in por_endpoint.items():
+            latencias = [m["latencia_ms"] for m in muestras]
+            errores = {}
+            for m in muestras:
+                if m["error"]:
+                    errores[m["error"]] = errores.get(m["error"], 0) + 1
+            resumen[endpoint] = {
+                "requests": len(muestras),
+                "throughput_rps": round(len(muestras) / duracion, 2) if duracion else 0.0,
+                "p50_ms": percentil(latencias, 50),
+                "p90_ms": percentil(latencias, 90),
+                "p99_ms": percentil(latencias, 99),
+                "max_ms": max(latencias),
+                "errores": sum(errores.values()),
+                "tasa_error": round(sum(errores.values()) / len(muestras), 4),
+                "tipos_error": errores,
+            }
+        return resumen
+
+
+def usuario_virtual(registro, usuario, turnos, id_prueba, pausa):
+    """Una conversación completa: en cada turno envía un mensaje a /chat y lee /history."""
+    thread_id = f"carga_{id_prueba}_{usuario}"
+    with requests.Session() as sesion:
+        for turno in range(turnos):
+            mensaje = PREGUNTAS_CARGA[turno % len(PREGUNTAS_CARGA)]
+            registro.medir(
+                sesion, "/chat", "POST", f"{API_URL}/chat", usuario, turno,
+                json={"message": mensaje, "thread_id": thread_id},
+                timeout=30
+            )
+            registro.medir(
+                sesion, "/history", "GET", f"{API_URL}/history/{thread_id}", usuario, turno,
+                timeout=5
+            )
+            if pausa:
+                time.sleep(pausa)
+
+
+def prueba_carga(args):
+    """
+    Ejecuta N usuarios virtuales con M turnos cada uno.
+    
+    - closed: los N usuarios empiezan a la vez y cada uno envía su siguiente
+      mensaje al recibir la respuesta anterior (mide la capacidad con N
+      clientes concurrentes).
+    - open: llega un usuario nuevo cada 1/rate segundos, sin esperar a los
+      anteriores (si la API no da abasto, los usuarios se acumulan y la
+      latencia crece, como con tráfico real).
+    """
+    id_prueba = uuid.uuid4().hex[:8]
+    print("\n" + "=" * 60)
+    print(f"🚀 Prueba de carga ({args.mode}): {args.users} usuarios x {args.turns} turnos")
+    if args.mode == "open":
+        print(f"   Llegada de usuarios: {args.rate}/s")
+    print("=" * 60)
+    
+    registro = RegistroCarga()
+    with ThreadPoolExecutor(max_workers=args.users) as pool:
+        for usuario in range(args.users):
+            if args.mode == "open":
+                # Llegadas a ritmo fijo, independientes de las respuestas
+                retraso = registro.inicio + usuario / args.rate - time.perf_counter()
+                if retraso > 0:
+                    time.sleep(retraso)
+            pool.submit(usuario_virtual, registro, usuario, args.turns, id_prueba, args.think_time)
+    duracion = time.perf_counter() - registro.inicio
+    
+    resumen = registro.resumen(duracion)
+    total = len(registro.muestras)
+    errores = sum(r["errores"] for r in resumen.values())
+    
+    print(f"\n📊 Resultados ({total} requests en {duracion:.1f} s, {total / duracion:.1f} req/s)")
+    print(f"{'endpoint':<10} {'req':>6} {'req/s':>7} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} {'errores':>8}")
+    for endpoint, r in resumen.items():
+        print(
+            f"{endpoint:<10} {r['requests']:>6} {r['throughput_rps']:>7.1f} {r['p50_ms']:>8.0f} "
+            f"{r['p90_ms']:>8.0f} {r['p99_ms']:>8.0f} {r['max_ms']:>8.0f} {r['tasa_error']:>7.1%}"
+        )
+        for tipo, cantidad in r["tipos_error"].items():
+            print(f"{'':<10}   ⚠️  {tipo}: {cantidad}")
+    
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "config": {
+                    "api_url": API_URL,
+                    "mode": args.mode,
+                    "users": args.users,
+                    "turns": args.turns,
+                    "rate": args.rate if args.mode == "open" else None,
+                    "think_time": args.think_time,
+                },
+                "duracion_s": round(duracion, 3),
+                "requests": total,
+                "endpoints": resumen,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"💾 Resumen guardado en {args.json}")
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(registro.muestras[0].keys()) if registro.muestras else ["endpoint"])
+            writer.writeheader()
+            writer.writerows(sorted(registro.muestras, key=lambda m: m["inicio_s"]))
+        print(f"💾 Requests individuales guardados en {args.csv}")
+    
+    tasa_error = errores / total if total else 1.0
+    if tasa_error > args.max_error_rate:
+        print(f"\n❌ Tasa de errores {tasa_error:.1%} mayor que el máximo permitido ({args.max_error_rate:.1%})")
+        return False
+    print("\n✅ Prueba de carga completada")
+    return True
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Prueba la API del agente de seguros (y mide su capacidad con --load)")
+    parser.add_argument("--url", default=API_URL, help="URL base de la API")
+    parser.add_argument("--load", action="store_true", help="Ejecutar la prueba de carga después de la verificación")
+    parser.add_argument("--users", type=int, default=10, help="Usuarios virtuales (conversaciones)")
+    parser.add_argument("--turns", type=int, default=3, help="Turnos (mensajes) por usuario")
+    parser.add_argument("--mode", choices=["closed", "open"], default="closed",
+                        help="closed: usuarios concurrentes; open: llegadas a ritmo fijo (--rate)")
+    parser.add_argument("--rate", type=float, default=1.0, help="Usuarios nuevos por segundo en modo open")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Segundos de pausa entre turnos de un usuario")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="Tasa de errores máxima para terminar con éxito")
+    parser.add_argument("--json", help="Guardar el resumen por endpoint en este archivo JSON")
+    parser.add_argument("--csv", help="Guardar cada request (endpoint, latencia, status) en este archivo CSV")
+    args = parser.parse_args()
+    if args.users < 1 or args.turns < 1 or args.rate <= 0:
+        parser.error("--users, --turns y --rate deben ser mayores que 0")
+    return args
+
+
 def main():
     """Ejecuta todas las pruebas"""
+    global API_URL
+    args = parse_args()
+    API_URL = args.url.rstrip("/")
+    
     print("\n")
     print("🧪 Iniciando pruebas de la API del Agente de Seguros")
     print("=" * 60)
@@ -149,7 +353,9 @@ def main():
     print(f"   /history: {'✅ PASS' if test3_ok else '❌ FAIL'}")
     print("=" * 60)
     
-    if test1_ok and test2_ok and test3_ok:
+    if test1_ok and test2_ok and test3_ok and args.load:
+        sys.exit(0 if prueba_carga(args) else 1)
+    elif test1_ok and test2_ok and test3_ok:
         print("\n🎉 ¡Todas las pruebas pasaron exitosamente!")
         print("   Estás listo para comenzar a desarrollar tu aplicación Dash.")
         print("\n📝 Siguiente paso:")
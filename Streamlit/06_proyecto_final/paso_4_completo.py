@@ -81,12 +81,18 @@ def verificar_conexion_api() -> bool:
     except:
         return False
 
+def nuevo_request_id() -> str:
+    """ID de la petición: aparece en los logs y trazas de la API para rastrearla"""
+    return f"streamlit-{uuid.uuid4().hex[:12]}"
+
 def enviar_mensaje_al_agente(mensaje: str, thread_id: str) -> dict:
     """Envía un mensaje al agente y retorna la respuesta"""
+    request_id = nuevo_request_id()
     try:
         response = requests.post(
             f"{API_URL}/chat",
             json={"message": mensaje, "thread_id": thread_id},
+            headers={"X-Request-ID": request_id},
             timeout=30
         )
         
@@ -94,22 +100,37 @@ def enviar_mensaje_al_agente(mensaje: str, thread_id: str) -> dict:
             data = response.json()
             return {"success": True, "response": data["response"]}
         else:
-            return {"success": False, "error": f"Error del servidor: {response.status_code}"}
+            return {"success": False, "error": f"Error del servidor: {response.status_code} (ID: {request_id})"}
             
     except requests.exceptions.Timeout:
-        return {"success": False, "error": "El agente tardó demasiado en responder"}
+        return {"success": False, "error": f"El agente tardó demasiado en responder (ID: {request_id})"}
     except requests.exceptions.ConnectionError:
         return {"success": False, "error": "No se pudo conectar. Verifica que el agente esté corriendo"}
     except Exception as e:
         return {"success": False, "error": f"Error inesperado: {str(e)}"}
 
 def obtener_historial(thread_id: str) -> dict:
-    """Obtiene el historial de mensajes del servidor"""
+    """
+    Obtiene el historial de mensajes del servidor.
+    
+    Guarda cada historial con su ETag: si la conversación no cambió, el
+    servidor responde 304 y se reutiliza la copia local sin descargarla.
+    """
+    cache = st.session_state.setdefault("cache_historial", {})
+    guardado = cache.get(thread_id)
+    headers = {"X-Request-ID": nuevo_request_id()}
+    if guardado:
+        headers["If-None-Match"] = guardado["etag"]
+    
     try:
-        response = requests.get(f"{API_URL}/history/{thread_id}", timeout=10)
+        response = requests.get(f"{API_URL}/history/{thread_id}", headers=headers, timeout=10)
         
-        if response.status_code == 200:
+        if response.status_code == 304 and guardado:
+            return {"success": True, "history": guardado["history"]}
+        elif response.status_code == 200:
             data = response.json()
+            if response.headers.get("ETag"):
+                cache[thread_id] = {"etag": response.headers["ETag"], "history": data["history"]}
             return {"success": True, "history": data["history"]}
         else:
             return {"success": False, "error": f"Error: {response.status_code}"}
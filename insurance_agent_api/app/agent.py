@@ -3,18 +3,92 @@ Agente de seguros con memoria usando LangGraph y Gemini 2.5 Flash.
 Este agente responde preguntas sobre una empresa ficticia de seguros.
 """
 
+import asyncio
 import os
-from typing import List, Dict, Any
-from langchain_core.messages import HumanMessage, SystemMessage, BaseMessage
+from typing import List, Dict, Any, AsyncIterator, Optional
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, BaseMessage
+from langchain_core.runnables import Runnable
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langgraph.graph import StateGraph, START, MessagesState
+from langgraph.graph import StateGraph, START, END, MessagesState
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.checkpoint.memory import MemorySaver
 from dotenv import load_dotenv
-from prompts import INSURANCE_AGENT_SYSTEM_PROMPT
+from cache import ResponseCache, SemanticCache, message_text
+from checkpointers import BoundedMemorySaver, latest_checkpoint_id
+import metrics
+import tracing
+from concurrency import KeyedLock, MicroBatcher, ProcessKeyedLock, SingleFlight, messages_key
+from config import (
+    CONTEXT_MAX_TURNS,
+    CATALOG_LOOKUP_ENABLED,
+    CONTEXT_SUMMARY_BATCH_TURNS,
+    FAST_PATH_ENABLED,
+    LLM_BACKEND,
+    LLM_BATCH_MAX_SIZE,
+    LLM_BATCH_WINDOW_MS,
+    LLM_SINGLE_FLIGHT,
+    PROMPT_RETRIEVAL_QUERY_TURNS,
+    PROMPT_RETRIEVAL_TOP_K,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_TTL_SECONDS,
+    SEMANTIC_CACHE_MAX_ENTRIES,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_TTL_SECONDS,
+    SEMANTIC_CACHE_VERIFY_RATE,
+    THREAD_LOCK_DIR,
+    THREAD_LOCK_STRIPES,
+)
+from prompts import (
+    INSURANCE_AGENT_SYSTEM_PROMPT,
+    CONVERSATION_SUMMARY_PROMPT,
+    SUMMARY_CONTEXT_HEADER,
+)
+from cassette import wrap_llm
+from catalog import INTENTS, CatalogIndex, synonym_map
+from fast_path import FastPath
+from retrieval import PromptAssembler
+from fake_llm import create_fake_llm
 
 # Cargar variables de entorno desde .env
 load_dotenv()
 
+# Marca interna que indica el fin del streaming de tokens
+_STREAM_END = object()
+
+# Nodos cuyos mensajes son la respuesta al usuario (se transmiten en chat_stream)
+_ANSWER_NODES = ("assistant", "classifier")
+
+
+def _serialize_history(messages: List[BaseMessage]) -> List[Dict[str, Any]]:
+    """Convierte mensajes al formato de /history."""
+    history = []
+    for msg in messages:
+        history.append({
+            "type": msg.type,
+            "content": msg.content
+        })
+    return history
+
+
+def _window_start(messages: List[BaseMessage], max_turns: int) -> int:
+    """Índice del primer mensaje de los últimos `max_turns` turnos."""
+    human_indexes = [i for i, msg in enumerate(messages) if msg.type == "human"]
+    if len(human_indexes) <= max_turns:
+        return 0
+    return human_indexes[-max_turns]
+
+
+class ConversationState(MessagesState):
+    """
+    Estado del grafo: mensajes más el resumen de los turnos antiguos.
+    
+    `summarized_until` es el índice del primer mensaje que aún no está
+    incluido en `summary`.
+    """
+    summary: str
+    summarized_until: int
+
 
 class InsuranceAgent:
     """
@@ -22,50 +96,309 @@ class InsuranceAgent:
     Representa a "SegurosVida+", una empresa ficticia de seguros.
     """
     
-    def __init__(self, google_api_key: str = None):
+    def __init__(
+        self,
+        google_api_key: str = None,
+        llm: BaseChatModel = None,
+        checkpointer: BaseCheckpointSaver = None
+    ):
         """
         Inicializa el agente de seguros.
         
         Args:
             google_api_key: API key de Google para Gemini
+            llm: Modelo de chat a usar en lugar del configurado en LLM_BACKEND
+                (útil para pruebas y benchmarks)
+            checkpointer: Dónde guardar las conversaciones (por defecto MemorySaver)
         """
+        if llm is not None:
+            self.llm = llm
+        else:
+            # Con LLM_CASSETTE_MODE se graba o reproduce el tráfico con el modelo
+            self.llm = wrap_llm(lambda: self._create_llm(google_api_key))
+        
+        # Configurar memoria
+        self.memory = checkpointer if checkpointer is not None else MemorySaver()
+        
+        # Mensaje del sistema con información de la empresa
+        self.system_message = SystemMessage(content=INSURANCE_AGENT_SYSTEM_PROMPT)
+        
+        # Prompt por recuperación: solo las secciones relevantes del catálogo (None = prompt completo)
+        self.prompt_assembler = None
+        if PROMPT_RETRIEVAL_TOP_K > 0:
+            self.prompt_assembler = PromptAssembler(PROMPT_RETRIEVAL_TOP_K, PROMPT_RETRIEVAL_QUERY_TURNS)
+        
+        # Política de contexto: últimos N turnos literales + resumen del resto
+        self.context_max_turns = CONTEXT_MAX_TURNS
+        self.summary_batch_turns = CONTEXT_SUMMARY_BATCH_TURNS
+        self._summarizing = set()
+        
+        # Caché de respuestas para preguntas repetidas (None = desactivada)
+        self.response_cache = None
+        if RESPONSE_CACHE_MAX_ENTRIES > 0:
+            self.response_cache = ResponseCache(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL_SECONDS)
+        
+        # Caché semántica para preguntas parecidas en el primer turno (None = desactivada)
+        self.semantic_cache = None
+        if SEMANTIC_CACHE_MAX_ENTRIES > 0:
+            self.semantic_cache = SemanticCache(
+                SEMANTIC_CACHE_MAX_ENTRIES,
+                SEMANTIC_CACHE_THRESHOLD,
+                ttl=SEMANTIC_CACHE_TTL_SECONDS,
+                verify_rate=SEMANTIC_CACHE_VERIFY_RATE,
+                synonyms=synonym_map(),
+                intents=INTENTS
+            )
+        
+        # Saludos, preguntas fuera de seguros y preguntas directas sobre el
+        # catálogo se responden sin el modelo (None = desactivada)
+        self.fast_path = None
+        if FAST_PATH_ENABLED or CATALOG_LOOKUP_ENABLED:
+            self.fast_path = FastPath(
+                rules=FAST_PATH_ENABLED,
+                catalog=CatalogIndex() if CATALOG_LOOKUP_ENABLED else None
+            )
+        
+        # Llamadas idénticas en curso comparten una sola petición a Gemini (None = desactivado)
+        self.single_flight = SingleFlight() if LLM_SINGLE_FLIGHT else None
+        
+        # Micro-batching: llamadas de hilos distintos que llegan en una ventana
+        # corta se envían juntas con la API batch del modelo (None = desactivado).
+        # Solo tiene sentido si el modelo tiene un endpoint batch propio: el
+        # `abatch` genérico de Runnable lanza una llamada por elemento, así que
+        # solo añadiría la espera de la ventana y quitaría el streaming.
+        self.micro_batcher = None
+        if LLM_BATCH_WINDOW_MS > 0 and not self._has_batch_endpoint(self.llm):
+            print(
+                f"⚠️ LLM_BATCH_WINDOW_MS ignorado: el modelo {type(self.llm).__name__} "
+                "no tiene API batch (cada elemento sería una llamada aparte)"
+            )
+        elif LLM_BATCH_WINDOW_MS > 0:
+            self.micro_batcher = MicroBatcher(
+                lambda batch: self.llm.abatch(batch, return_exceptions=True),
+                window=LLM_BATCH_WINDOW_MS / 1000,
+                max_size=LLM_BATCH_MAX_SIZE
+            )
+        
+        # Los turnos de un mismo hilo se procesan en orden, uno a la vez
+        # (también entre workers si comparten THREAD_LOCK_DIR)
+        if THREAD_LOCK_DIR:
+            self.thread_locks = ProcessKeyedLock(THREAD_LOCK_DIR, THREAD_LOCK_STRIPES)
+        else:
+            self.thread_locks = KeyedLock()
+        # La expulsión LRU del checkpointer en memoria respeta los turnos en curso
+        if isinstance(self.memory, BoundedMemorySaver):
+            self.memory.busy = self.thread_locks.active
+        
+        # Tareas en segundo plano (streams que siguen tras desconectarse el
+        # cliente, actualización de resúmenes)
+        self._background_tasks = set()
+        
+        # Construir el grafo
+        self._build_graph()
+    
+    @staticmethod
+    def _create_llm(google_api_key: Optional[str]) -> BaseChatModel:
+        """Crea el modelo indicado en LLM_BACKEND."""
+        if LLM_BACKEND == "fake":
+            # Modelo simulado para pruebas de carga sin red ni API key
+            return create_fake_llm()
+        if LLM_BACKEND != "gemini":
+            raise ValueError(f"LLM_BACKEND desconocido: {LLM_BACKEND!r}")
+        
         if google_api_key:
             os.environ["GOOGLE_API_KEY"] = google_api_key
         elif not os.environ.get("GOOGLE_API_KEY"):
             raise ValueError("Se requiere GOOGLE_API_KEY")
         
         # Inicializar modelo Gemini 2.5 Flash
-        self.llm = ChatGoogleGenerativeAI(
+        return ChatGoogleGenerativeAI(
             model="gemini-2.5-flash",
             temperature=0
         )
-        
-        # Configurar memoria
-        self.memory = MemorySaver()
-        
-        # Mensaje del sistema con información de la empresa
-        self.system_message = SystemMessage(content=INSURANCE_AGENT_SYSTEM_PROMPT)
-        
-        # Construir el grafo
-        self._build_graph()
+    
+    @staticmethod
+    def _has_batch_endpoint(llm: BaseChatModel) -> bool:
+        """Indica si el modelo reimplementa `abatch` con una API batch real."""
+        return type(llm).abatch is not Runnable.abatch
     
     def _build_graph(self):
         """Construye el grafo de conversación con memoria."""
         
-        def assistant_node(state: MessagesState) -> Dict[str, List[BaseMessage]]:
-            """Nodo del asistente que procesa mensajes."""
-            messages = [self.system_message] + state["messages"]
-            response = self.llm.invoke(messages)
+        @tracing.traced("graph.node assistant")
+        async def assistant_node(state: ConversationState) -> Dict[str, List[BaseMessage]]:
+            """
+            Nodo del asistente que procesa mensajes.
+            
+            Es asíncrono para que la llamada a Gemini no ocupe el event loop
+            ni un hilo del executor mientras se espera la respuesta.
+            """
+            messages = self._build_prompt(state)
+            
+            # Las respuestas en caché también se devuelven como mensaje del
+            # nodo, así quedan guardadas en el historial del hilo.
+            cache_key = None
+            if self.response_cache is not None:
+                cache_key = self.response_cache.make_key(messages)
+                cached = self.response_cache.get(cache_key)
+                metrics.record_cache("response", cached is not None)
+                if cached is not None:
+                    return {"messages": [AIMessage(content=cached)]}
+            
+            # La caché semántica solo se usa en el primer turno, cuando la
+            # respuesta no depende de mensajes anteriores.
+            question = None
+            semantic_hit = None
+            if self.semantic_cache is not None and len(state["messages"]) == 1:
+                question = message_text(state["messages"][-1])
+                semantic_hit, verify = self.semantic_cache.lookup(question)
+                metrics.record_cache("semantic", semantic_hit is not None)
+                if semantic_hit is not None and not verify:
+                    return {"messages": [AIMessage(content=semantic_hit)]}
+            
+            with metrics.llm_wait():
+                response = await self._call_llm(messages)
+            
+            text = message_text(response)
+            if text and cache_key is not None:
+                self.response_cache.set(cache_key, text)
+            if text and question is not None:
+                if semantic_hit is not None:
+                    # Un falso acierto se seguiría sirviendo a las preguntas
+                    # parecidas: se sustituye por la respuesta nueva
+                    if self.semantic_cache.record_verification(semantic_hit, text):
+                        self.semantic_cache.discard(semantic_hit)
+                        self.semantic_cache.add(question, text)
+                else:
+                    self.semantic_cache.add(question, text)
             return {"messages": [response]}
         
+        @tracing.traced("graph.node classifier")
+        async def classifier_node(state: ConversationState) -> Dict[str, List[BaseMessage]]:
+            """
+            Nodo de la ruta rápida: responde sin el modelo los saludos, las
+            preguntas fuera de seguros y las preguntas directas sobre el
+            catálogo. La respuesta queda en el historial como cualquier otra.
+            """
+            label, response = self.fast_path.answer(message_text(state["messages"][-1]))
+            metrics.record_fast_path(label)
+            if response is None:
+                return {}
+            return {"messages": [AIMessage(content=response)]}
+        
+        def after_classifier(state: ConversationState) -> str:
+            # Si el clasificador ya respondió, el turno termina sin llamar al modelo
+            return END if state["messages"][-1].type == "ai" else "assistant"
+        
         # Crear el grafo
-        builder = StateGraph(MessagesState)
+        builder = StateGraph(ConversationState)
         builder.add_node("assistant", assistant_node)
-        builder.add_edge(START, "assistant")
+        if self.fast_path is not None:
+            builder.add_node("classifier", classifier_node)
+            builder.add_edge(START, "classifier")
+            builder.add_conditional_edges("classifier", after_classifier, ["assistant", END])
+        else:
+            builder.add_edge(START, "assistant")
         
         # Compilar con memoria
         self.graph = builder.compile(checkpointer=self.memory)
     
+    async def _call_llm(self, messages: List[BaseMessage]) -> BaseMessage:
+        """
+        Llama al modelo, compartiendo la petición con llamadas idénticas en curso.
+        
+        Con micro-batching activado la llamada se agrupa con otras en un
+        lote; en ese caso la respuesta no se transmite token a token.
+        
+        Los hilos que reutilizan una petición en curso reciben su propia
+        copia del mensaje (sin id) para que su historial le asigne uno nuevo.
+        """
+        async def invoke() -> BaseMessage:
+            with tracing.span("llm.call", model=self.llm._llm_type, micro_batched=self.micro_batcher is not None):
+                if self.micro_batcher is not None:
+                    return await metrics.timed_llm_call(self.micro_batcher.submit(messages))
+                return await metrics.timed_llm_call(self.llm.ainvoke(messages))
+        
+        if self.single_flight is None:
+            return await invoke()
+        response, shared = await self.single_flight.do(messages_key(messages), invoke)
+        return response.model_copy(update={"id": None}) if shared else response
+    
+    def _build_prompt(self, state: ConversationState) -> List[BaseMessage]:
+        """
+        Construye la lista de mensajes que se envía al modelo.
+        
+        Sin política de contexto se envía toda la conversación. Con
+        CONTEXT_MAX_TURNS se envían solo los mensajes aún no resumidos
+        (los últimos turnos) y el resumen se añade al mensaje del sistema.
+        Con PROMPT_RETRIEVAL_TOP_K el mensaje del sistema solo lleva las
+        secciones del catálogo relevantes para la conversación.
+        """
+        messages = state["messages"]
+        system_message = self.system_message
+        if self.prompt_assembler is not None:
+            system_message = SystemMessage(content=self.prompt_assembler.system_prompt(messages))
+        if not self.context_max_turns:
+            return [system_message] + messages
+        
+        summary = state.get("summary")
+        if summary:
+            system_message = SystemMessage(
+                content=f"{system_message.content}\n\n{SUMMARY_CONTEXT_HEADER}\n{summary}"
+            )
+        return [system_message] + messages[state.get("summarized_until", 0):]
+    
+    def _schedule_summary(self, thread_id: str) -> None:
+        """Lanza la actualización del resumen en segundo plano, fuera del camino crítico."""
+        if not self.context_max_turns or thread_id in self._summarizing:
+            return
+        self._summarizing.add(thread_id)
+        task = asyncio.create_task(self._refresh_summary(thread_id))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+    
+    async def _refresh_summary(self, thread_id: str) -> None:
+        """
+        Incorpora al resumen los turnos que han salido de la ventana.
+        
+        Solo se llama al modelo cuando se han acumulado al menos
+        `summary_batch_turns` turnos fuera de la ventana, y únicamente con
+        esos mensajes nuevos más el resumen anterior (resumen incremental).
+        """
+        config = {"configurable": {"thread_id": thread_id}}
+        try:
+            state = await self.graph.aget_state(config)
+            messages = state.values.get("messages", [])
+            start = state.values.get("summarized_until", 0)
+            end = _window_start(messages, self.context_max_turns)
+            pending = messages[start:end]
+            if sum(1 for msg in pending if msg.type == "human") < self.summary_batch_turns:
+                return
+            
+            transcript = "\n".join(
+                f"{'Cliente' if msg.type == 'human' else 'Asistente'}: {message_text(msg)}"
+                for msg in pending
+            )
+            prompt = CONVERSATION_SUMMARY_PROMPT.format(
+                summary=state.values.get("summary") or "(sin resumen previo)",
+                transcript=transcript
+            )
+            with tracing.span("llm.summary", model=self.llm._llm_type, thread_id=thread_id):
+                response = await metrics.timed_llm_call(self.llm.ainvoke([HumanMessage(content=prompt)]))
+            # Solo la escritura va bajo el lock del hilo: así no bloquea el
+            # siguiente turno mientras se genera el resumen, pero tampoco se
+            # intercala con un turno que lo sobrescribiría.
+            async with self.thread_locks.hold(thread_id):
+                await self.graph.aupdate_state(
+                    config,
+                    {"summary": message_text(response), "summarized_until": end},
+                    as_node="assistant"
+                )
+        except Exception as e:
+            print(f"⚠️ No se pudo actualizar el resumen del hilo {thread_id}: {e}")
+        finally:
+            self._summarizing.discard(thread_id)
+    
     async def chat(self, message: str, thread_id: str = "default") -> Dict[str, Any]:
         """
         Procesa un mensaje del usuario.
@@ -80,8 +413,11 @@ class InsuranceAgent:
         config = {"configurable": {"thread_id": thread_id}}
         human_message = HumanMessage(content=message)
         
-        # Ejecutar el grafo
-        result = await self.graph.ainvoke({"messages": [human_message]}, config)
+        # Ejecutar el grafo (un turno a la vez por hilo para no perder mensajes)
+        with metrics.graph_turn(), tracing.span("graph.run", thread_id=thread_id):
+            async with self.thread_locks.hold(thread_id):
+                result = await self.graph.ainvoke({"messages": [human_message]}, config)
+        self._schedule_summary(thread_id)
         
         # Extraer la última respuesta del asistente
         last_ai_message = None
@@ -95,24 +431,114 @@ class InsuranceAgent:
             "thread_id": thread_id
         }
     
-    async def get_conversation_history(self, thread_id: str = "default") -> List[Dict[str, Any]]:
-        """Obtiene el historial de conversación."""
-        config = {"configurable": {"thread_id": thread_id}}
+    async def chat_stream(self, message: str, thread_id: str = "default") -> AsyncIterator[str]:
+        """
+        Procesa un mensaje del usuario emitiendo la respuesta token a token.
         
-        try:
-            state = self.graph.get_state(config)
+        El grafo se ejecuta en una tarea independiente: si el cliente se
+        desconecta a mitad de la respuesta, la ejecución termina igualmente
+        y el mensaje final queda guardado en el checkpoint del hilo.
+        
+        Args:
+            message: Mensaje del usuario
+            thread_id: ID del hilo de conversación
             
-            if not state.values or "messages" not in state.values:
-                return []
+        Yields:
+            Fragmentos de texto de la respuesta del asistente
+        """
+        config = {"configurable": {"thread_id": thread_id}}
+        human_message = HumanMessage(content=message)
+        queue: asyncio.Queue = asyncio.Queue()
+        
+        async def run_graph():
+            try:
+                with metrics.graph_turn(), tracing.span("graph.run", thread_id=thread_id, streaming=True):
+                    async with self.thread_locks.hold(thread_id):
+                        async for chunk, metadata in self.graph.astream(
+                            {"messages": [human_message]}, config, stream_mode="messages"
+                        ):
+                            if metadata.get("langgraph_node") not in _ANSWER_NODES:
+                                continue
+                            text = message_text(chunk)
+                            if text:
+                                queue.put_nowait(text)
+                self._schedule_summary(thread_id)
+                queue.put_nowait(_STREAM_END)
+            except Exception as e:
+                queue.put_nowait(e)
+        
+        task = asyncio.create_task(run_graph())
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        
+        while True:
+            item = await queue.get()
+            if item is _STREAM_END:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    
+    async def get_history_version(self, thread_id: str = "default") -> Optional[str]:
+        """
+        Versión actual de la conversación (id del último checkpoint).
+        
+        Es una consulta barata que no deserializa los mensajes, pensada para
+        responder 304 cuando el cliente ya tiene la última versión.
+        """
+        return await latest_checkpoint_id(self.memory, thread_id)
+    
+    async def get_history_page(
+        self,
+        thread_id: str = "default",
+        limit: Optional[int] = None,
+        before: Optional[int] = None,
+        since: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Obtiene una página del historial de conversación.
+        
+        Los cursores son posiciones en la lista de mensajes, que solo crece:
+        
+        Args:
+            thread_id: ID del hilo de conversación
+            limit: Máximo de mensajes a devolver
+            before: Devolver solo mensajes con posición menor (páginas anteriores)
+            since: Devolver solo mensajes desde esta posición (mensajes nuevos)
             
-            history = []
-            for msg in state.values["messages"]:
-                history.append({
-                    "type": msg.type,
-                    "content": msg.content
-                })
+        Returns:
+            Diccionario con `history` (mensajes de la página), `total` (mensajes
+            en la conversación), `start` (posición del primer mensaje devuelto)
+            y `version` (id del checkpoint leído)
             
-            return history
+        Raises:
+            Exception: Si falla la lectura del checkpointer (no se oculta como
+                historial vacío)
+        """
+        config = {"configurable": {"thread_id": thread_id}}
+        
+        state = await self.graph.aget_state(config)
         
-        except Exception:
-            return []
+        messages = state.values.get("messages", []) if state.values else []
+        total = len(messages)
+        start = min(since, total) if since is not None else 0
+        end = max(min(before, total), start) if before is not None else total
+        if limit is not None:
+            if since is not None and before is None:
+                # Mensajes nuevos: los primeros `limit` desde `since`
+                end = min(start + limit, end)
+            else:
+                # Por defecto, la página más reciente
+                start = max(end - limit, start)
+        
+        return {
+            "history": _serialize_history(messages[start:end]),
+            "total": total,
+            "start": start,
+            "version": (state.config or {}).get("configurable", {}).get("checkpoint_id")
+        }
+    
+    async def get_conversation_history(self, thread_id: str = "default") -> List[Dict[str, Any]]:
+        """Obtiene el historial de conversación."""
+        page = await self.get_history_page(thread_id)
+        return page["history"]
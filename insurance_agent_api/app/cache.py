@@ -0,0 +1,330 @@
+"""
+Cachés de respuestas para preguntas repetidas.
+
+- ResponseCache: coincidencia exacta. La clave combina el prompt del
+  sistema, el contexto previo de la conversación y el último mensaje del
+  usuario normalizado, de modo que solo se reutiliza una respuesta cuando
+  el modelo vería exactamente la misma conversación.
+- SemanticCache: variantes de una misma pregunta ("¿Cuánto cuesta el
+  seguro de auto?" / "cuanto cuesta un seguro de autos"). Las palabras se
+  llevan a una forma canónica con un mapa de sinónimos (carro -> auto,
+  vale -> precio) y solo se comparan preguntas con las mismas palabras
+  canónicas, mediante vectores de n-gramas de caracteres calculados
+  localmente, sin servicios externos de embeddings.
+
+Los n-gramas por sí solos no sirven para esto: "precio seguro auto" y
+"cuánto vale el seguro de carro" apenas se parecen (0.05), mientras que
+"¿...para mi moto?" o "¿...en Perú?" se parecen más de 0.9 a la pregunta
+del seguro de auto. benchmarks/eval_semantic_cache.py mide ambos casos.
+"""
+
+import hashlib
+import math
+import random
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from langchain_core.messages import BaseMessage
+
+# Signos que no cambian el significado al principio o final de una pregunta
+_EDGE_PUNCTUATION = " \t\n¿?¡!.,;:"
+
+
+def normalize_message(text: str) -> str:
+    """Normaliza un mensaje: mayúsculas, espacios y signos de los extremos."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = re.sub(r"\s+", " ", text)
+    return text.strip(_EDGE_PUNCTUATION)
+
+
+def message_text(message: BaseMessage) -> str:
+    """Extrae el texto de un mensaje, sea contenido plano o lista de bloques."""
+    content = message.content
+    if isinstance(content, str):
+        return content
+    parts = []
+    for block in content:
+        if isinstance(block, str):
+            parts.append(block)
+        elif isinstance(block, dict) and block.get("type") == "text":
+            parts.append(block.get("text", ""))
+    return "".join(parts)
+
+
+def _strip_accents(text: str) -> str:
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def message_words(text: str) -> List[str]:
+    """Palabras de un mensaje en minúsculas y sin tildes (para clasificar por palabras clave)."""
+    return re.findall(r"[a-z0-9]+", _strip_accents(text.casefold()))
+
+
+# Palabras que no distinguen una pregunta de otra (incluye "seguro", presente en casi todas)
+_STOPWORDS = frozenset("""
+a al como con cual cuales de del el en es la las lo los me mi mis o para por que quiero se
+su sus te tu tus un una unos unas y yo favor hola porfa porfavor seguro seguros
+""".split())
+
+
+# Palabras de relleno que no cambian lo que se pregunta ("quisiera saber...")
+_FILLER_WORDS = frozenset("""
+dime digame informacion sobre puedo podria quisiera saber gustaria necesito tiene tienen
+usted ustedes es esta este mas
+""".split())
+
+
+def vectorize(text: str, dimensions: int = 1 << 18, ngram_sizes: Tuple[int, ...] = (3, 4)) -> Dict[int, float]:
+    """
+    Vector disperso normalizado de n-gramas de caracteres con hashing.
+    
+    Cada n-grama (dentro de cada palabra, con espacios como bordes) se
+    asigna a una de `dimensions` posiciones mediante un hash estable. Las
+    palabras vacías se ignoran.
+    """
+    text = " " + _strip_accents(normalize_message(text)) + " "
+    text = re.sub(r"[^\w ]+", " ", text)
+    vector: Dict[int, float] = {}
+    for word in text.split():
+        if word in _STOPWORDS:
+            continue
+        padded = f" {word} "
+        for size in ngram_sizes:
+            for i in range(max(len(padded) - size + 1, 1)):
+                gram = padded[i:i + size].encode("utf-8")
+                index = int.from_bytes(hashlib.blake2b(gram, digest_size=8).digest(), "little") % dimensions
+                vector[index] = vector.get(index, 0.0) + 1.0
+    norm = math.sqrt(sum(value * value for value in vector.values()))
+    if norm:
+        for index in vector:
+            vector[index] /= norm
+    return vector
+
+
+def cosine(a: Dict[int, float], b: Dict[int, float]) -> float:
+    """Similitud coseno entre dos vectores normalizados."""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(value * b.get(index, 0.0) for index, value in a.items())
+
+
+class ResponseCache:
+    """
+    Caché LRU con expiración (TTL) de respuestas del modelo.
+    
+    La clave incluye el prompt del sistema completo (ver `make_key`), así
+    que un prompt distinto nunca reutiliza respuestas anteriores.
+    """
+    
+    def __init__(self, max_entries: int, ttl: float):
+        """
+        Args:
+            max_entries: Número máximo de respuestas guardadas
+            ttl: Segundos que una respuesta sigue siendo válida (0 = sin expiración)
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def make_key(messages: List[BaseMessage]) -> str:
+        """
+        Clave para la lista de mensajes que se enviaría al modelo.
+        
+        El último mensaje (la pregunta actual) se normaliza; el resto del
+        contexto se usa literalmente.
+        """
+        digest = hashlib.sha256()
+        for message in messages[:-1]:
+            digest.update(f"{message.type}\x00{message.content}\x01".encode("utf-8"))
+        last = messages[-1]
+        digest.update(f"{last.type}\x00{normalize_message(str(last.content))}".encode("utf-8"))
+        return digest.hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        """Devuelve la respuesta guardada o None si no existe o expiró."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (self.ttl and entry[0] < time.monotonic()):
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    
+    def set(self, key: str, response: str) -> None:
+        """Guarda una respuesta, expulsando la menos usada si la caché está llena."""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Estadísticas de uso de la caché."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class SemanticCache:
+    """
+    Caché de respuestas a preguntas parecidas, para el primer turno de
+    una conversación.
+    
+    Cada pregunta se reduce a sus palabras canónicas: sin palabras vacías
+    ni de relleno y con los sinónimos de `synonyms` sustituidos. Las que no
+    son una intención (`intents`: precio, cobertura...) identifican de qué
+    se pregunta, y solo se comparan preguntas con las mismas, en el mismo
+    orden: una palabra distinta ("moto", "usado", "Perú") o un orden
+    distinto ("¿el de auto es más caro que el de hogar?") puede cambiar la
+    respuesta. Entre ellas se devuelve la respuesta de la más parecida si
+    la similitud coseno de los n-gramas de sus palabras canónicas supera
+    `threshold`, lo que distingue "¿cuánto cuesta?" de "¿qué cubre?".
+    
+    Guarda hasta `max_entries` preguntas. Una fracción `verify_rate` de
+    los aciertos se verifica llamando igualmente al modelo: si la
+    respuesta nueva no se parece a la guardada (similitud <
+    `answer_threshold`) se cuenta como falso acierto, se usa la
+    respuesta nueva y quien llama sustituye la entrada (`discard` y
+    `add`).
+    """
+    
+    def __init__(
+        self,
+        max_entries: int,
+        threshold: float,
+        ttl: float = 0,
+        verify_rate: float = 0.0,
+        answer_threshold: float = 0.5,
+        synonyms: Optional[Dict[str, str]] = None,
+        intents: Iterable[str] = (),
+        seed: Optional[int] = None
+    ):
+        self.max_entries = max_entries
+        self.synonyms = synonyms or {}
+        self.intents = frozenset(intents)
+        self.threshold = threshold
+        self.ttl = ttl
+        self.verify_rate = verify_rate
+        self.answer_threshold = answer_threshold
+        self._entries: "OrderedDict[str, Tuple[float, Tuple[str, ...], Dict[int, float], str]]" = OrderedDict()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.verified = 0
+        self.false_hits = 0
+    
+    def terms(self, question: str) -> List[str]:
+        """Palabras canónicas de una pregunta."""
+        return [
+            self.synonyms.get(word, word) for word in message_words(question)
+            if word not in _STOPWORDS and word not in _FILLER_WORDS
+        ]
+    
+    def _subject(self, terms: List[str]) -> Tuple[str, ...]:
+        # Palabras que no son intenciones, en orden y sin repeticiones seguidas
+        subject: List[str] = []
+        for term in terms:
+            if term not in self.intents and (not subject or subject[-1] != term):
+                subject.append(term)
+        return tuple(subject)
+    
+    def similarity(self, a: str, b: str) -> float:
+        """Similitud entre dos preguntas según las reglas de la caché (0 si preguntan por cosas distintas)."""
+        terms_a, terms_b = self.terms(a), self.terms(b)
+        if self._subject(terms_a) != self._subject(terms_b):
+            return 0.0
+        return cosine(vectorize(" ".join(terms_a)), vectorize(" ".join(terms_b)))
+    
+    def lookup(self, question: str) -> Tuple[Optional[str], bool]:
+        """
+        Busca la pregunta guardada más parecida.
+        
+        Returns:
+            (respuesta o None, si el acierto debe verificarse con el modelo)
+        """
+        terms = self.terms(question)
+        subject = self._subject(terms)
+        vector = vectorize(" ".join(terms))
+        now = time.monotonic()
+        with self._lock:
+            best_key, best_score = None, 0.0
+            for key, (expires_at, entry_subject, entry_vector, _) in self._entries.items():
+                if self.ttl and expires_at < now:
+                    continue
+                if entry_subject != subject:
+                    continue
+                score = cosine(vector, entry_vector)
+                if score > best_score:
+                    best_key, best_score = key, score
+            
+            if best_key is None or best_score < self.threshold:
+                self.misses += 1
+                return None, False
+            
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            verify = self._random.random() < self.verify_rate
+            return self._entries[best_key][3], verify
+    
+    def record_verification(self, cached: str, fresh: str) -> bool:
+        """
+        Compara la respuesta en caché con la del modelo en un acierto verificado.
+        
+        Returns:
+            True si fue un falso acierto
+        """
+        false_hit = cosine(vectorize(cached), vectorize(fresh)) < self.answer_threshold
+        with self._lock:
+            self.verified += 1
+            if false_hit:
+                self.false_hits += 1
+        return false_hit
+    
+    def discard(self, response: str) -> None:
+        """Elimina las entradas que devuelven `response` (p. ej. tras un falso acierto)."""
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry[3] == response]:
+                del self._entries[key]
+    
+    def add(self, question: str, response: str) -> None:
+        """Guarda una pregunta y su respuesta, expulsando la menos usada si está llena."""
+        key = _strip_accents(normalize_message(question))
+        terms = self.terms(question)
+        vector = vectorize(" ".join(terms))
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, self._subject(terms), vector, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Estadísticas de uso de la caché."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "verified_hits": self.verified,
+                "false_hits": self.false_hits,
+                "false_hit_rate": self.false_hits / self.verified if self.verified else None,
+            }
@@ -0,0 +1,258 @@
+"""
+Grabación y reproducción ("cassette") del tráfico con el modelo.
+
+Con LLM_CASSETTE_MODE=record cada llamada real a Gemini se guarda en un
+archivo JSONL, incluidos los tiempos de llegada de cada fragmento en
+streaming. Con LLM_CASSETTE_MODE=replay ese mismo tráfico se reproduce sin
+red, a la velocidad original o acelerada (LLM_CASSETTE_SPEED), pasando por
+assistant_node igual que una llamada real.
+
+Cada línea del archivo es una llamada:
+
+    {"key": "...", "input": "...", "output": "...", "latency": 1.234,
+     "chunks": [[0.412, "El "], [0.433, "seguro "], ...]}
+
+- key: huella del prompt completo (sistema + historial), ver messages_key
+- input / output: última pregunta del usuario y respuesta, en texto
+- latency: segundos hasta la respuesta completa
+- chunks: segundos desde el inicio de la llamada hasta cada fragmento
+
+Los campos input/output hacen que el archivo sirva también como
+FAKE_LLM_REPLAY_PATH del modelo simulado.
+"""
+
+import asyncio
+import atexit
+import json
+import queue
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import Field
+
+from cache import message_text, normalize_message
+from concurrency import messages_key
+from config import LLM_CASSETTE_MODE, LLM_CASSETTE_PATH, LLM_CASSETTE_SPEED
+from fake_llm import FakeChatModel, create_fake_llm
+
+
+def _last_question(messages: List[BaseMessage]) -> str:
+    question = next((m for m in reversed(messages) if m.type == "human"), None)
+    return message_text(question) if question else ""
+
+
+def load_cassette(path: str) -> List[Dict[str, Any]]:
+    """Lee todas las llamadas grabadas en un cassette."""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    return records
+
+
+class CassetteWriter:
+    """
+    Añade registros a un cassette desde un hilo propio.
+    
+    write() solo encola el registro: la serialización y la escritura en
+    disco ocurren en el hilo escritor, fuera del event loop.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.recorded = 0
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="cassette-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+    
+    def write(self, record: Dict[str, Any]) -> None:
+        self._queue.put(record)
+    
+    def _run(self) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                record = self._queue.get()
+                if record is None:
+                    break
+                f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+                self.recorded += 1
+                # Un solo flush por ráfaga de registros
+                if self._queue.empty():
+                    f.flush()
+    
+    def close(self) -> None:
+        """Escribe lo pendiente y detiene el hilo escritor."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+
+class RecordingChatModel(BaseChatModel):
+    """Envuelve un modelo real y graba cada llamada completada en un cassette."""
+    
+    inner: BaseChatModel
+    writer: Any
+    
+    @property
+    def _llm_type(self) -> str:
+        return f"cassette-record-{self.inner._llm_type}"
+    
+    def _record(self, messages: List[BaseMessage], output: str, latency: float,
+                chunks: List[List[Any]]) -> None:
+        self.writer.write({
+            "key": messages_key(messages),
+            "input": _last_question(messages),
+            "output": output,
+            "latency": round(latency, 4),
+            "chunks": chunks,
+        })
+    
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        start = time.perf_counter()
+        response = self.inner.invoke(messages, config={"callbacks": []}, stop=stop, **kwargs)
+        latency = time.perf_counter() - start
+        text = message_text(response)
+        self._record(messages, text, latency, [[round(latency, 4), text]])
+        return ChatResult(generations=[ChatGeneration(message=response)])
+    
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        start = time.perf_counter()
+        response = await self.inner.ainvoke(messages, config={"callbacks": []}, stop=stop, **kwargs)
+        latency = time.perf_counter() - start
+        text = message_text(response)
+        self._record(messages, text, latency, [[round(latency, 4), text]])
+        return ChatResult(generations=[ChatGeneration(message=response)])
+    
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        start = time.perf_counter()
+        chunks = []
+        # Sin callbacks propios: los fragmentos ya se notifican desde este modelo
+        # (si no, el streaming de LangGraph los emitiría dos veces)
+        async for chunk in self.inner.astream(messages, config={"callbacks": []}, stop=stop, **kwargs):
+            text = message_text(chunk)
+            if text:
+                chunks.append([round(time.perf_counter() - start, 4), text])
+            yield ChatGenerationChunk(message=chunk)
+        # Solo se graban las respuestas completas (no las interrumpidas)
+        self._record(messages, "".join(text for _, text in chunks), time.perf_counter() - start, chunks)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {"mode": "record", "path": self.writer.path, "recorded": self.writer.recorded}
+
+
+class ReplayChatModel(FakeChatModel):
+    """
+    Reproduce las llamadas de un cassette con sus tiempos originales.
+    
+    Busca primero la llamada con el mismo prompt completo y, si no la hay,
+    una con la misma última pregunta. Las llamadas que no están en el
+    cassette las responde el modelo simulado (respuestas predefinidas).
+    `speed` divide los tiempos grabados (2.0 = el doble de rápido).
+    """
+    
+    recordings: Dict[str, Dict[str, Any]] = Field(default_factory=dict)
+    by_question: Dict[str, Dict[str, Any]] = Field(default_factory=dict)
+    speed: float = 1.0
+    hits: int = 0
+    misses: int = 0
+    
+    @classmethod
+    def from_records(cls, records: List[Dict[str, Any]], **kwargs: Any) -> "ReplayChatModel":
+        model = cls(**kwargs)
+        for record in records:
+            model.recordings[record["key"]] = record
+            model.by_question[normalize_message(record["input"])] = record
+        return model
+    
+    @property
+    def _llm_type(self) -> str:
+        return "cassette-replay"
+    
+    def _find(self, messages: List[BaseMessage]) -> Optional[Dict[str, Any]]:
+        record = self.recordings.get(messages_key(messages))
+        if record is None:
+            record = self.by_question.get(normalize_message(_last_question(messages)))
+        if record is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return record
+    
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        record = self._find(messages)
+        if record is None:
+            return super()._generate(messages, stop, run_manager, **kwargs)
+        time.sleep(record["latency"] / self.speed)
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages, record["output"]))])
+    
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        record = self._find(messages)
+        if record is None:
+            return await super()._agenerate(messages, stop, run_manager, **kwargs)
+        await asyncio.sleep(record["latency"] / self.speed)
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages, record["output"]))])
+    
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        record = self._find(messages)
+        if record is None:
+            async for chunk in super()._astream(messages, stop, run_manager, **kwargs):
+                yield chunk
+            return
+        chunks = record["chunks"] or [[record["latency"], record["output"]]]
+        usage = self._usage(messages, record["output"])
+        elapsed = 0.0
+        for i, (offset, text) in enumerate(chunks):
+            await asyncio.sleep(max(offset - elapsed, 0) / self.speed)
+            elapsed = offset
+            last = i == len(chunks) - 1
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text, usage_metadata=usage if last else None))
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": "replay",
+            "recordings": len(self.recordings),
+            "speed": self.speed,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def wrap_llm(create_llm: Any) -> BaseChatModel:
+    """
+    Aplica LLM_CASSETTE_MODE al modelo.
+    
+    Args:
+        create_llm: Función que crea el modelo real. En modo replay no se
+            llama, así que no hacen falta red ni API key.
+    """
+    if LLM_CASSETTE_MODE == "replay":
+        return create_fake_llm(
+            ReplayChatModel.from_records,
+            records=load_cassette(LLM_CASSETTE_PATH),
+            speed=LLM_CASSETTE_SPEED
+        )
+    if LLM_CASSETTE_MODE == "record":
+        return RecordingChatModel(inner=create_llm(), writer=CassetteWriter(LLM_CASSETTE_PATH))
+    if LLM_CASSETTE_MODE != "off":
+        raise ValueError(f"LLM_CASSETTE_MODE desconocido: {LLM_CASSETTE_MODE!r}")
+    return create_llm()
+
+
+def cassette_stats(llm: BaseChatModel) -> Optional[Dict[str, Any]]:
+    """Estadísticas del cassette para /health (None si no está activo)."""
+    if isinstance(llm, (RecordingChatModel, ReplayChatModel)):
+        return llm.stats()
+    return None
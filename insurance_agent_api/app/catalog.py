@@ -0,0 +1,290 @@
+"""
+Catálogo de productos de SegurosVida+ como datos estructurados.
+
+Es la única fuente de los datos de la empresa, los productos, los servicios
+y el contacto:
+
+- render_catalog() genera la parte del prompt del sistema con esos datos
+  (prompts.py la incluye, así que el modelo ve exactamente el catálogo);
+  con PROMPT_RETRIEVAL_TOP_K solo se incluyen las secciones relevantes
+- CatalogIndex responde sin el modelo las preguntas directas de precio,
+  cobertura, deducible y contacto ("¿Cuánto cuesta el seguro de auto?")
+
+Para cambiar un precio o una cobertura basta con editar este archivo.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+
+from cache import message_words
+
+COMPANY = {
+    "name": "SegurosVida+",
+    "slogan": "Tu tranquilidad, nuestra prioridad",
+    "years": 25,
+    "coverage": "Nacional e internacional",
+    "rating": "4.8/5 estrellas",
+}
+
+# aliases: nombres del producto para las respuestas directas (CatalogIndex);
+# keywords: términos adicionales para recuperar su sección (retrieval.py).
+# Las coberturas pueden referirse a otros campos del producto ({deductible_from})
+PRODUCTS: List[Dict[str, Any]] = [
+    {
+        "id": "vida",
+        "name": "Seguro de Vida",
+        "aliases": ["vida"],
+        "keywords": ["beneficiario", "fallecimiento", "muerte", "herederos", "familia"],
+        "price_from": "$25/mes",
+        "coverage": [
+            "Cobertura desde $50,000 hasta $1,000,000",
+            "Beneficiarios ilimitados",
+            "Cobertura por muerte natural o accidental",
+            "Opciones de pago mensual, trimestral o anual",
+        ],
+    },
+    {
+        "id": "auto",
+        "name": "Seguro de Auto",
+        "aliases": ["auto", "autos", "automovil", "carro", "carros", "coche", "coches", "vehiculo", "vehiculos"],
+        "keywords": ["choque", "accidente", "grua", "taller", "robo", "moto"],
+        "price_from": "$45/mes",
+        "deductible_from": "$500",
+        "coverage": [
+            "Todo riesgo con franquicia desde {deductible_from}",
+            "Asistencia en carretera 24/7",
+            "Auto de reemplazo mientras se repara el tuyo",
+            "Cobertura a terceros incluida",
+        ],
+    },
+    {
+        "id": "hogar",
+        "name": "Seguro de Hogar",
+        "aliases": ["hogar", "casa", "vivienda"],
+        "keywords": ["apartamento", "robo", "incendio", "inundacion", "muebles", "electrodomesticos"],
+        "price_from": "$35/mes",
+        "coverage": [
+            "Protección contra incendios, robos e inundaciones",
+            "Responsabilidad civil incluida",
+            "Cobertura de contenidos hasta $200,000",
+            "Asistencia de emergencia en el hogar",
+        ],
+    },
+    {
+        "id": "salud",
+        "name": "Seguro de Salud",
+        "aliases": ["salud", "medico", "medica"],
+        "keywords": ["dentista", "odontologo", "doctor", "clinica", "hospital", "lentes", "gafas", "medicina", "examenes"],
+        "price_from": "$80/mes",
+        "coverage": [
+            "Red de más de 500 clínicas y hospitales",
+            "Cobertura dental y oftalmológica",
+            "Medicamentos con descuento de hasta 50%",
+            "Chequeos anuales gratuitos",
+            "Planes familiares disponibles",
+        ],
+    },
+    {
+        "id": "viaje",
+        "name": "Seguro de Viaje",
+        "aliases": ["viaje", "viajes", "viajar"],
+        "keywords": ["maleta", "equipaje", "vuelo", "extranjero", "exterior", "vacaciones", "pasaporte"],
+        "price_from": "$15 por viaje",
+        "coverage": [
+            "Cobertura internacional",
+            "Asistencia médica en el extranjero",
+            "Cancelación de vuelos",
+            "Pérdida de equipaje",
+        ],
+    },
+]
+
+SERVICES = [
+    "Atención al cliente 24/7",
+    "App móvil para gestionar pólizas",
+    "Proceso de reclamaciones en línea (respuesta en 48h)",
+    "Descuentos por antigüedad (hasta 20%)",
+    "Asesoría personalizada gratuita",
+]
+
+CONTACT = {
+    "phone": "1-800-SEGVIDA (1-800-734-8432)",
+    "email": "contacto@segurosvida.com",
+    "whatsapp": "+57 300 123 4567",
+    "offices": "Oficinas en las principales ciudades del país",
+}
+
+
+def product_coverage(product: Dict[str, Any]) -> List[str]:
+    """Coberturas del producto con los campos referenciados ya sustituidos."""
+    return [item.format(**product) for item in product["coverage"]]
+
+
+def render_company() -> str:
+    return "\n".join([
+        "INFORMACIÓN DE LA EMPRESA:",
+        f"- Nombre: {COMPANY['name']}",
+        f"- Lema: \"{COMPANY['slogan']}\"",
+        f"- Años de experiencia: {COMPANY['years']} años",
+        f"- Cobertura: {COMPANY['coverage']}",
+        f"- Calificación de clientes: {COMPANY['rating']}",
+    ])
+
+
+def render_product(number: int, product: Dict[str, Any]) -> str:
+    lines = [f"{number}. {product['name'].upper()}"]
+    lines += [f"   - {item}" for item in product_coverage(product)]
+    lines.append(f"   - Desde {product['price_from']}")
+    return "\n".join(lines)
+
+
+def render_services() -> str:
+    return "\n".join(["SERVICIOS ADICIONALES:"] + [f"- {service}" for service in SERVICES])
+
+
+def render_contact() -> str:
+    return "\n".join([
+        "CONTACTO:",
+        f"- Teléfono: {CONTACT['phone']}",
+        f"- Email: {CONTACT['email']}",
+        f"- WhatsApp: {CONTACT['whatsapp']}",
+        f"- {CONTACT['offices']}",
+    ])
+
+
+def catalog_sections() -> List[Dict[str, Any]]:
+    """
+    Secciones del catálogo para recuperarlas por separado (ver retrieval.py).
+    
+    Cada sección tiene `id`, el `text` con el que aparece en el prompt y
+    `keywords` adicionales para buscarla.
+    """
+    sections = [{"id": "empresa", "text": render_company(), "keywords": ["quienes", "somos", "trayectoria", "opiniones"]}]
+    for number, product in enumerate(PRODUCTS, start=1):
+        sections.append({
+            "id": product["id"],
+            "text": render_product(number, product),
+            "keywords": product["aliases"] + product["keywords"],
+        })
+    sections.append({
+        "id": "servicios",
+        "text": render_services(),
+        "keywords": ["reclamacion", "reclamo", "siniestro", "aplicacion", "celular", "descuento", "asesor"],
+    })
+    sections.append({"id": "contacto", "text": render_contact(), "keywords": ["llamar", "numero", "direccion"]})
+    return sections
+
+
+def render_catalog(section_ids: Optional[Iterable[str]] = None) -> str:
+    """
+    Bloque del prompt con la empresa, los productos, los servicios y el contacto.
+    
+    Args:
+        section_ids: Secciones a incluir (ids de catalog_sections), en el
+            orden del catálogo. None = el catálogo completo.
+    """
+    selected = None if section_ids is None else set(section_ids)
+    texts = {section["id"]: section["text"] for section in catalog_sections()
+             if selected is None or section["id"] in selected}
+    blocks = [texts[key] for key in ("empresa",) if key in texts]
+    products = [texts[product["id"]] for product in PRODUCTS if product["id"] in texts]
+    if products:
+        blocks += ["PRODUCTOS PRINCIPALES:", "\n\n".join(products)]
+    blocks += [texts[key] for key in ("servicios", "contacto") if key in texts]
+    return "\n\n".join(blocks)
+
+
+# Palabras que indican qué se pregunta (sin tildes, en minúsculas)
+_INTENT_WORDS = {
+    "price": {"cuanto", "cuesta", "cuestan", "precio", "precios", "vale", "valen", "valor", "costo", "tarifa", "mensualidad"},
+    "coverage": {"cubre", "cubren", "cobertura", "coberturas", "incluye", "incluyen", "beneficios"},
+    "deductible": {"deducible", "franquicia"},
+    "contact": {"contacto", "contactar", "contactarlos", "contactarme", "comunicarme", "comunico",
+                "llamar", "llamo", "telefono", "numero", "whatsapp", "correo", "email"},
+}
+
+# Intenciones reconocidas (también las usa la caché semántica)
+INTENTS = tuple(_INTENT_WORDS)
+
+# Palabras que no cambian la pregunta. Cualquier otra palabra (una edad, un
+# modelo de carro, "para mi hijo") hace que la pregunta pase al modelo.
+_FILLER_WORDS = frozenset("""
+a al como con cual cuales de del dime digame el en es esta este hola informacion la las lo los
+me mas mi por favor puedo que quiero saber seguro seguros segurosvida sobre su sus tiene tienen
+tu un una y
+""".split())
+
+
+class CatalogIndex:
+    """
+    Índice en memoria para responder preguntas directas sobre el catálogo.
+    
+    Las respuestas se generan una sola vez al crear el índice; cada consulta
+    solo clasifica las palabras del mensaje y busca en un diccionario.
+    
+    Es conservador a propósito: solo responde si todas las palabras del
+    mensaje son conocidas, hay una sola intención y (salvo el contacto) un
+    solo producto. Todo lo demás lo responde el modelo.
+    """
+    
+    def __init__(self, products: List[Dict[str, Any]] = PRODUCTS, contact: Dict[str, str] = CONTACT):
+        self._product_by_alias = {alias: product["id"] for product in products for alias in product["aliases"]}
+        self._intent_by_word = {word: intent for intent, words in _INTENT_WORDS.items() for word in words}
+        self._vocabulary = _FILLER_WORDS | set(self._product_by_alias) | set(self._intent_by_word)
+        
+        closing = f"¿Te gustaría una cotización personalizada? Escríbenos al WhatsApp {contact['whatsapp']} o llámanos al {contact['phone']}."
+        self._contact_answer = (
+            f"Puedes contactarnos por cualquiera de estos medios:\n"
+            f"- Teléfono: {contact['phone']} (atención 24/7)\n"
+            f"- Email: {contact['email']}\n"
+            f"- WhatsApp: {contact['whatsapp']}\n"
+            f"- {contact['offices']}"
+        )
+        self._answers: Dict[tuple, str] = {}
+        for product in products:
+            coverage = "\n".join(f"- {item}" for item in product_coverage(product))
+            self._answers[("price", product["id"])] = (
+                f"El {product['name']} está disponible desde {product['price_from']} e incluye:\n"
+                f"{coverage}\n\n{closing}"
+            )
+            self._answers[("coverage", product["id"])] = (
+                f"El {product['name']} incluye:\n{coverage}\n\n"
+                f"Está disponible desde {product['price_from']}. {closing}"
+            )
+            if "deductible_from" in product:
+                self._answers[("deductible", product["id"])] = (
+                    f"El {product['name']} tiene franquicia (deducible) desde {product['deductible_from']}, "
+                    f"y está disponible desde {product['price_from']}. {closing}"
+                )
+    
+    def lookup(self, text: str) -> Optional[str]:
+        """Respuesta del catálogo para `text`, o None si debe responder el modelo."""
+        words = message_words(text)
+        if not words or any(word not in self._vocabulary for word in words):
+            return None
+        intents = {self._intent_by_word[word] for word in words if word in self._intent_by_word}
+        products = {self._product_by_alias[word] for word in words if word in self._product_by_alias}
+        
+        if intents == {"contact"}:
+            return self._contact_answer
+        # "¿Cuánto cubre...?" es una pregunta de cobertura
+        if intents == {"price", "coverage"}:
+            intents = {"coverage"}
+        if len(intents) != 1 or len(products) != 1:
+            return None
+        return self._answers.get((intents.pop(), products.pop()))
+    
+    def stats(self) -> Dict[str, Any]:
+        return {"answers": len(self._answers) + 1, "vocabulary": len(self._vocabulary)}
+
+
+def synonym_map() -> Dict[str, str]:
+    """
+    Forma canónica de los nombres de producto y de las palabras de intención
+    ("carro" -> "auto", "vale" -> "price"), para la caché semántica.
+    
+    Las palabras de contacto no se incluyen: "teléfono" y "correo" piden
+    datos distintos.
+    """
+    synonyms = {word: intent for intent, words in _INTENT_WORDS.items() if intent != "contact" for word in words}
+    synonyms.update({alias: product["id"] for product in PRODUCTS for alias in product["aliases"]})
+    return synonyms
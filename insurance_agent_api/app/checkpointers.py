@@ -0,0 +1,277 @@
+"""
+Backends de checkpointer para la memoria de conversaciones.
+
+El backend se elige con CHECKPOINTER_BACKEND:
+- "memory": en memoria del proceso, con expulsión LRU/TTL de hilos inactivos
+  (se pierde al reiniciar)
+- "sqlite": archivo SQLite local en modo WAL (persistente y con memoria acotada)
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional, Sequence, Set, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+)
+from langgraph.checkpoint.memory import MemorySaver
+
+import config
+
+
+class BoundedMemorySaver(MemorySaver):
+    """
+    MemorySaver con expulsión de hilos inactivos.
+    
+    Lleva el orden de último acceso de cada thread_id (LRU) y expulsa
+    los hilos completos cuando se supera `max_threads` o cuando llevan
+    más de `idle_ttl` segundos sin usarse (ver `sweep`). También cuenta
+    los bytes serializados que ocupa cada hilo.
+    
+    Los hilos para los que `busy(thread_id)` es True (p. ej. con un turno
+    en curso que ya leyó su checkpoint y aún va a escribir) no se expulsan
+    por LRU: su siguiente escritura recrearía el hilo sin el historial
+    anterior. Mientras tanto puede haber temporalmente más de
+    `max_threads` hilos.
+    """
+    
+    def __init__(self, max_threads: int = 0, idle_ttl: float = 0, busy: Optional[Callable[[str], bool]] = None):
+        super().__init__()
+        self.max_threads = max_threads
+        self.idle_ttl = idle_ttl
+        self.busy = busy
+        self._last_access: "OrderedDict[str, float]" = OrderedDict()
+        self._thread_bytes: Dict[str, int] = {}
+        self._lock = threading.RLock()
+        self.evicted_lru = 0
+        self.evicted_ttl = 0
+    
+    def _touch(self, thread_id: str) -> None:
+        self._last_access[thread_id] = time.monotonic()
+        self._last_access.move_to_end(thread_id)
+    
+    def _account(self, thread_id: str, size: int) -> None:
+        self._thread_bytes[thread_id] = self._thread_bytes.get(thread_id, 0) + size
+    
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        with self._lock:
+            thread_id = config["configurable"]["thread_id"]
+            if thread_id not in self._last_access:
+                # Hilo desconocido o expulsado: evita que el defaultdict lo recree vacío
+                return None
+            self._touch(thread_id)
+            return super().get_tuple(config)
+    
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        with self._lock:
+            if config is not None and config["configurable"]["thread_id"] not in self._last_access:
+                # Igual que en get_tuple: no recrear hilos desconocidos o expulsados
+                return iter(())
+            return super().list(config, filter=filter, before=before, limit=limit)
+    
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        with self._lock:
+            result = super().put(config, checkpoint, metadata, new_versions)
+            thread_id = config["configurable"]["thread_id"]
+            checkpoint_ns = config["configurable"]["checkpoint_ns"]
+            saved, saved_metadata, _ = self.storage[thread_id][checkpoint_ns][checkpoint["id"]]
+            size = len(saved[1]) + len(saved_metadata[1])
+            for channel, version in new_versions.items():
+                size += len(self.blobs[(thread_id, checkpoint_ns, channel, version)][1])
+            self._account(thread_id, size)
+            self._touch(thread_id)
+            self._evict_overflow(keep=thread_id)
+            return result
+    
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        with self._lock:
+            thread_id = config["configurable"]["thread_id"]
+            key = (thread_id, config["configurable"].get("checkpoint_ns", ""), config["configurable"]["checkpoint_id"])
+            before = _writes_size(self.writes.get(key, {}))
+            super().put_writes(config, writes, task_id, task_path)
+            self._account(thread_id, _writes_size(self.writes.get(key, {})) - before)
+            self._touch(thread_id)
+    
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._evict({thread_id})
+    
+    def _evict(self, thread_ids: Set[str]) -> None:
+        """Elimina varios hilos recorriendo writes y blobs una sola vez."""
+        for thread_id in thread_ids:
+            self.storage.pop(thread_id, None)
+            self._last_access.pop(thread_id, None)
+            self._thread_bytes.pop(thread_id, None)
+        for key in [k for k in self.writes if k[0] in thread_ids]:
+            del self.writes[key]
+        for key in [k for k in self.blobs if k[0] in thread_ids]:
+            del self.blobs[key]
+    
+    def _evict_overflow(self, keep: str) -> None:
+        """Expulsa los hilos menos usados recientemente si se supera max_threads."""
+        if not self.max_threads or len(self._last_access) <= self.max_threads:
+            return
+        overflow = len(self._last_access) - self.max_threads
+        victims = set()
+        for thread_id in self._last_access:
+            if len(victims) == overflow:
+                break
+            if thread_id != keep and not (self.busy and self.busy(thread_id)):
+                victims.add(thread_id)
+        self._evict(victims)
+        self.evicted_lru += len(victims)
+    
+    def sweep(self) -> int:
+        """
+        Expulsa los hilos inactivos durante más de `idle_ttl` segundos.
+        
+        Returns:
+            Número de hilos expulsados
+        """
+        if not self.idle_ttl:
+            return 0
+        with self._lock:
+            deadline = time.monotonic() - self.idle_ttl
+            victims = set()
+            for thread_id, last_access in self._last_access.items():
+                if last_access > deadline:
+                    break
+                if not (self.busy and self.busy(thread_id)):
+                    victims.add(thread_id)
+            if victims:
+                self._evict(victims)
+                self.evicted_ttl += len(victims)
+            return len(victims)
+    
+    async def run_sweeper(self, interval: float) -> None:
+        """Ejecuta `sweep` periódicamente hasta que se cancele la tarea."""
+        while True:
+            await asyncio.sleep(interval)
+            self.sweep()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Estadísticas de ocupación y expulsiones."""
+        with self._lock:
+            return {
+                "backend": "memory",
+                "threads": len(self._last_access),
+                "resident_bytes": sum(self._thread_bytes.values()),
+                "max_threads": self.max_threads,
+                "idle_ttl_seconds": self.idle_ttl,
+                "evicted_threads_lru": self.evicted_lru,
+                "evicted_threads_ttl": self.evicted_ttl,
+            }
+
+
+def _writes_size(writes: Dict[Any, Any]) -> int:
+    """Bytes serializados de las escrituras pendientes de un checkpoint."""
+    return sum(len(value[2][1]) for value in writes.values())
+
+
+@asynccontextmanager
+async def _open_sqlite(path: str) -> AsyncIterator[BaseCheckpointSaver]:
+    """Abre un checkpointer SQLite en modo WAL."""
+    import aiosqlite
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+    
+    async with aiosqlite.connect(path) as conn:
+        # WAL permite lecturas concurrentes mientras se escribe; con
+        # synchronous=NORMAL cada turno no fuerza un fsync completo.
+        # busy_timeout primero: con varios workers abriendo la base a la vez,
+        # los demás PRAGMA y setup() esperan en lugar de fallar
+        await conn.execute("PRAGMA busy_timeout=5000")
+        await conn.execute("PRAGMA journal_mode=WAL")
+        await conn.execute("PRAGMA synchronous=NORMAL")
+        # Valor negativo = tamaño en KB: la caché no crece con el número de hilos
+        await conn.execute(f"PRAGMA cache_size=-{config.SQLITE_CACHE_SIZE_KB}")
+        saver = AsyncSqliteSaver(conn)
+        await saver.setup()
+        yield saver
+
+
+@asynccontextmanager
+async def open_checkpointer(backend: Optional[str] = None) -> AsyncIterator[BaseCheckpointSaver]:
+    """
+    Crea el checkpointer configurado y lo cierra al salir del contexto.
+    
+    Args:
+        backend: "memory" o "sqlite" (por defecto CHECKPOINTER_BACKEND)
+        
+    Yields:
+        Checkpointer listo para compilar el grafo
+    """
+    backend = backend or config.CHECKPOINTER_BACKEND
+    
+    if backend == "memory":
+        saver = BoundedMemorySaver(
+            max_threads=config.MEMORY_MAX_THREADS,
+            idle_ttl=config.MEMORY_THREAD_TTL_SECONDS
+        )
+        sweeper = None
+        if saver.idle_ttl and config.MEMORY_SWEEP_INTERVAL_SECONDS > 0:
+            sweeper = asyncio.create_task(saver.run_sweeper(config.MEMORY_SWEEP_INTERVAL_SECONDS))
+        try:
+            yield saver
+        finally:
+            if sweeper is not None:
+                sweeper.cancel()
+    elif backend == "sqlite":
+        async with _open_sqlite(config.SQLITE_CHECKPOINT_PATH) as saver:
+            yield saver
+    else:
+        raise ValueError(f"CHECKPOINTER_BACKEND desconocido: {backend!r} (usa 'memory' o 'sqlite')")
+
+
+async def latest_checkpoint_id(saver: BaseCheckpointSaver, thread_id: str) -> Optional[str]:
+    """
+    Id del último checkpoint de un hilo, sin deserializar sus mensajes.
+    
+    Los ids de checkpoint son crecientes, así que sirven como versión de la
+    conversación (p. ej. para ETags). Devuelve None si el hilo no existe.
+    """
+    if isinstance(saver, MemorySaver):
+        # .get() en lugar de [] para no crear entradas vacías en el defaultdict
+        return max(saver.storage.get(thread_id, {}).get("", {}), default=None)
+    
+    try:
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+    except ImportError:
+        AsyncSqliteSaver = None
+    if AsyncSqliteSaver is not None and isinstance(saver, AsyncSqliteSaver):
+        await saver.setup()
+        async with saver.conn.execute(
+            "SELECT MAX(checkpoint_id) FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ''",
+            (thread_id,)
+        ) as cursor:
+            row = await cursor.fetchone()
+        return row[0] if row else None
+    
+    checkpoint = await saver.aget_tuple({"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}})
+    return checkpoint.checkpoint["id"] if checkpoint else None
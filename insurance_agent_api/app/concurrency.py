@@ -0,0 +1,370 @@
+"""
+Utilidades de concurrencia para las llamadas al modelo.
+"""
+
+import asyncio
+import contextvars
+import hashlib
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Tuple
+
+from langchain_core.messages import BaseMessage
+
+
+def messages_key(messages: List[BaseMessage]) -> str:
+    """Clave exacta de una lista de mensajes (tipo y contenido de cada uno)."""
+    digest = hashlib.sha256()
+    for message in messages:
+        digest.update(f"{message.type}\x00{message.content}\x01".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class SingleFlight:
+    """
+    Agrupa llamadas idénticas que están en curso al mismo tiempo.
+    
+    La primera llamada con una clave lanza la operación; las que llegan
+    mientras sigue en curso esperan ese mismo resultado (o excepción) en
+    lugar de lanzar otra. La operación se ejecuta en su propia tarea, así
+    que si se cancela quien la inició, los demás siguen esperándola.
+    """
+    
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.calls = 0
+        self.shared = 0
+    
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Ejecuta `fn` o se une a la ejecución en curso con la misma clave.
+        
+        Args:
+            key: Identificador de la operación
+            fn: Función asíncrona sin argumentos que realiza la operación
+            
+        Returns:
+            (resultado de `fn`, True si se reutilizó una ejecución en curso)
+        """
+        task = self._inflight.get(key)
+        shared = task is not None
+        if shared:
+            self.shared += 1
+        else:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            self.calls += 1
+        return await asyncio.shield(task), shared
+    
+    def stats(self) -> Dict[str, Any]:
+        """Llamadas realizadas, llamadas compartidas y operaciones en curso."""
+        return {
+            "upstream_calls": self.calls,
+            "coalesced_calls": self.shared,
+            "in_flight": len(self._inflight),
+        }
+
+
+class MicroBatcher:
+    """
+    Agrupa llamadas independientes que llegan en una ventana corta.
+    
+    Cada `submit` añade un elemento al lote en curso. El lote se envía a
+    `fn` cuando alcanza `max_size` elementos o cuando pasan `window`
+    segundos desde el primero, y cada llamador recibe su resultado (o su
+    excepción, si `fn` devuelve excepciones por elemento).
+    
+    El temporizador y el lote se ejecutan en un contexto vacío: si
+    heredaran las contextvars de quien envió el primer elemento, los
+    callbacks de LangChain de esa petición (p. ej. el streaming de
+    /chat/stream) recibirían los tokens de todo el lote.
+    """
+    
+    def __init__(self, fn: Callable[[List[Any]], Awaitable[List[Any]]], window: float, max_size: int):
+        """
+        Args:
+            fn: Función asíncrona que procesa una lista de elementos y devuelve
+                una lista de resultados en el mismo orden
+            window: Segundos máximos que espera el primer elemento de un lote
+            max_size: Elementos máximos por lote
+        """
+        self.fn = fn
+        self.window = window
+        self.max_size = max_size
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer = None
+        self._tasks = set()
+        self.batches = 0
+        self.items = 0
+    
+    async def submit(self, item: Any) -> Any:
+        """Añade `item` al lote en curso y espera su resultado."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush, context=contextvars.Context())
+        return await future
+    
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        self.batches += 1
+        self.items += len(batch)
+        # Si el lote se llena dentro de `submit`, se estaría heredando el
+        # contexto del llamador actual
+        task = contextvars.Context().run(asyncio.ensure_future, self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        try:
+            results = await self.fn([item for item, _ in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Lotes enviados y tamaño medio de lote."""
+        return {
+            "window_ms": round(self.window * 1000, 1),
+            "max_batch_size": self.max_size,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else None,
+        }
+
+
+class KeyedLock:
+    """
+    Un lock asyncio por clave (p. ej. por thread_id).
+    
+    Las operaciones con la misma clave se ejecutan en orden de llegada y
+    las de claves distintas en paralelo. La entrada de una clave solo
+    existe mientras alguien tiene o espera su lock, así que la tabla no
+    crece con el número de conversaciones vistas.
+    """
+    
+    def __init__(self):
+        # clave -> [lock, número de tareas que lo tienen o lo esperan]
+        self._locks: Dict[str, List[Any]] = {}
+        self.contended = 0
+    
+    @asynccontextmanager
+    async def hold(self, key: str) -> AsyncIterator[None]:
+        """Context manager que adquiere el lock de `key`."""
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = [asyncio.Lock(), 0]
+            self._locks[key] = entry
+        elif entry[0].locked():
+            self.contended += 1
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+    
+    def active(self, key: str) -> bool:
+        """Indica si alguna tarea tiene o espera el lock de `key`."""
+        return key in self._locks
+    
+    def stats(self) -> Dict[str, Any]:
+        """Claves con lock activo y esperas por contención."""
+        return {
+            "active_keys": len(self._locks),
+            "contended_acquisitions": self.contended,
+        }
+
+
+class ProcessKeyedLock(KeyedLock):
+    """
+    Lock por clave que también excluye a otros procesos (varios workers).
+    
+    Dentro del proceso se ordena con KeyedLock; entre procesos, cada clave
+    se asigna a uno de `stripes` archivos de lock (flock) en `directory`.
+    Dos claves distintas pueden compartir archivo y esperarse entre sí, lo
+    que solo ocurre con probabilidad 1/stripes. La espera entre procesos se
+    hace sondeando sin bloquear, para no ocupar el event loop ni hilos.
+    
+    Requiere un sistema POSIX (fcntl).
+    """
+    
+    def __init__(self, directory: str, stripes: int = 1024):
+        super().__init__()
+        import fcntl
+        self._fcntl = fcntl
+        self.directory = directory
+        self.stripes = stripes
+        self.process_contended = 0
+        os.makedirs(directory, exist_ok=True)
+    
+    def _path(self, key: str) -> str:
+        # Hash estable entre procesos (hash() cambia en cada proceso)
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+        stripe = int.from_bytes(digest, "big") % self.stripes
+        return os.path.join(self.directory, f"thread-{stripe:05d}.lock")
+    
+    @asynccontextmanager
+    async def hold(self, key: str) -> AsyncIterator[None]:
+        """Context manager que adquiere el lock de `key` en este y en los demás procesos."""
+        async with super().hold(key):
+            # Descriptor propio en cada adquisición: flock excluye también a
+            # otros descriptores del mismo proceso
+            fd = os.open(self._path(key), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                delay = 0.001
+                while True:
+                    try:
+                        self._fcntl.flock(fd, self._fcntl.LOCK_EX | self._fcntl.LOCK_NB)
+                        break
+                    except BlockingIOError:
+                        if delay == 0.001:
+                            self.process_contended += 1
+                        await asyncio.sleep(delay)
+                        delay = min(delay * 2, 0.05)
+                try:
+                    yield
+                finally:
+                    self._fcntl.flock(fd, self._fcntl.LOCK_UN)
+            finally:
+                os.close(fd)
+    
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats.update({
+            "lock_directory": self.directory,
+            "stripes": self.stripes,
+            "cross_process_contended_acquisitions": self.process_contended,
+        })
+        return stats
+
+
+class QueueFullError(Exception):
+    """No hay hueco en la cola de espera (o se agotó el tiempo de espera)."""
+    
+    def __init__(self, retry_after: int):
+        super().__init__(f"Servidor ocupado, reintenta en {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Control de admisión: límite de peticiones concurrentes con cola acotada.
+    
+    Hasta `max_concurrency` peticiones se procesan a la vez; las siguientes
+    esperan en una cola de como máximo `max_queue` peticiones. Si la cola
+    está llena, o una petición espera más de `queue_timeout` segundos, se
+    rechaza con QueueFullError indicando cuándo reintentar.
+    """
+    
+    def __init__(self, max_concurrency: int = 0, max_queue: int = 0, queue_timeout: float = 0):
+        """
+        Args:
+            max_concurrency: Peticiones procesadas a la vez (0 = sin límite)
+            max_queue: Peticiones que pueden esperar turno
+            queue_timeout: Segundos máximos de espera en cola (0 = sin límite)
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency > 0 else None
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        # Media móvil del tiempo de servicio, para estimar Retry-After
+        self._avg_service_time = 1.0
+    
+    def retry_after(self) -> int:
+        """Segundos estimados hasta que haya hueco para una petición nueva."""
+        if not self.max_concurrency:
+            return 1
+        pending = self.waiting + 1
+        return max(1, math.ceil(self._avg_service_time * pending / self.max_concurrency))
+    
+    async def acquire(self, bounded: bool = True) -> float:
+        """
+        Espera turno para procesar una petición.
+        
+        Args:
+            bounded: Si es False, la petición espera aunque la cola esté llena
+                (para trabajos internos como los lotes, que ya limitan su concurrencia)
+        
+        Returns:
+            Instante de admisión, que debe pasarse a `release`
+            
+        Raises:
+            QueueFullError: Si la cola está llena o se agota el tiempo de espera
+        """
+        if self._semaphore is not None:
+            # Se cuenta con los contadores propios (no con el semáforo) porque
+            # se actualizan antes de ceder el control al event loop.
+            if bounded and self.active + self.waiting >= self.max_concurrency + self.max_queue:
+                self.rejected += 1
+                raise QueueFullError(self.retry_after())
+            
+            self.waiting += 1
+            try:
+                if self.queue_timeout and bounded:
+                    await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+                else:
+                    await self._semaphore.acquire()
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                raise QueueFullError(self.retry_after())
+            finally:
+                self.waiting -= 1
+        
+        self.active += 1
+        self.admitted += 1
+        return time.monotonic()
+    
+    def release(self, admitted_at: float) -> None:
+        """Libera el hueco de una petición admitida con `acquire`."""
+        self.active -= 1
+        if self._semaphore is not None:
+            self._semaphore.release()
+        elapsed = time.monotonic() - admitted_at
+        self._avg_service_time = 0.9 * self._avg_service_time + 0.1 * elapsed
+    
+    @asynccontextmanager
+    async def slot(self, bounded: bool = True) -> AsyncIterator[None]:
+        """Context manager equivalente a `acquire` + `release`."""
+        admitted_at = await self.acquire(bounded)
+        try:
+            yield
+        finally:
+            self.release(admitted_at)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Peticiones en curso, profundidad de la cola y rechazos."""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "in_flight": self.active,
+            "queue_depth": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_service_seconds": round(self._avg_service_time, 3),
+        }
@@ -0,0 +1,140 @@
+"""
+Configuración del agente de seguros leída desde variables de entorno.
+"""
+
+import os
+from dotenv import load_dotenv
+
+# Cargar variables de entorno desde .env
+load_dotenv()
+
+
+def _env_int(name: str, default: int) -> int:
+    """Lee una variable de entorno entera, con valor por defecto."""
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name: str, default: float) -> float:
+    """Lee una variable de entorno decimal, con valor por defecto."""
+    value = os.environ.get(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    """Lee una variable de entorno booleana (1/true/yes/on), con valor por defecto."""
+    value = os.environ.get(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Modelo de lenguaje: "gemini" o "fake" (simulado, sin red ni API key)
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "gemini").strip().lower()
+
+# Modelo simulado (solo con LLM_BACKEND=fake): latencia hasta el primer token,
+# con distribución constant/uniform/normal/lognormal/exponential, y pausa entre tokens
+FAKE_LLM_LATENCY_DISTRIBUTION = os.environ.get("FAKE_LLM_LATENCY_DISTRIBUTION", "constant").strip().lower()
+FAKE_LLM_LATENCY_MS = _env_float("FAKE_LLM_LATENCY_MS", 500)
+FAKE_LLM_LATENCY_JITTER_MS = _env_float("FAKE_LLM_LATENCY_JITTER_MS", 0)
+FAKE_LLM_TOKEN_DELAY_MS = _env_float("FAKE_LLM_TOKEN_DELAY_MS", 0)
+# Semilla para que la secuencia de latencias sea reproducible (vacío = aleatoria)
+FAKE_LLM_SEED = os.environ.get("FAKE_LLM_SEED") or None
+# JSON {palabra clave: respuesta} que reemplaza las respuestas predefinidas
+FAKE_LLM_ANSWERS_PATH = os.environ.get("FAKE_LLM_ANSWERS_PATH", "")
+# JSONL con respuestas grabadas {"input": ..., "output": ...}
+FAKE_LLM_REPLAY_PATH = os.environ.get("FAKE_LLM_REPLAY_PATH", "")
+
+# Cassette del tráfico con el modelo: "off", "record" (graba las llamadas
+# reales) o "replay" (las reproduce sin red, LLM_CASSETTE_SPEED veces más rápido)
+LLM_CASSETTE_MODE = os.environ.get("LLM_CASSETTE_MODE", "off").strip().lower()
+LLM_CASSETTE_PATH = os.environ.get("LLM_CASSETTE_PATH", "llm_cassette.jsonl")
+LLM_CASSETTE_SPEED = _env_float("LLM_CASSETTE_SPEED", 1.0)
+
+# Trazas OpenTelemetry: "" (desactivadas), "console", "file" u "otlp"
+TRACING_EXPORTER = os.environ.get("TRACING_EXPORTER", "").strip().lower()
+# Archivo de spans (un JSON por línea) con TRACING_EXPORTER=file
+TRACING_FILE_PATH = os.environ.get("TRACING_FILE_PATH", "traces.jsonl")
+
+# Checkpointer donde se guardan las conversaciones: "memory" o "sqlite"
+CHECKPOINTER_BACKEND = os.environ.get("CHECKPOINTER_BACKEND", "memory").strip().lower()
+
+# Ruta del archivo SQLite (solo con CHECKPOINTER_BACKEND=sqlite)
+SQLITE_CHECKPOINT_PATH = os.environ.get("SQLITE_CHECKPOINT_PATH", "checkpoints.sqlite")
+
+# Tamaño máximo de la caché de páginas de SQLite en KB (acota la memoria del proceso)
+SQLITE_CACHE_SIZE_KB = _env_int("SQLITE_CACHE_SIZE_KB", 8192)
+
+# Límites del checkpointer en memoria (0 = sin límite)
+MEMORY_MAX_THREADS = _env_int("MEMORY_MAX_THREADS", 10000)
+MEMORY_THREAD_TTL_SECONDS = _env_float("MEMORY_THREAD_TTL_SECONDS", 24 * 3600)
+MEMORY_SWEEP_INTERVAL_SECONDS = _env_float("MEMORY_SWEEP_INTERVAL_SECONDS", 60)
+
+# Ventana de contexto: turnos recientes que se envían literalmente al modelo
+# (0 = enviar toda la conversación). Los anteriores se resumen.
+CONTEXT_MAX_TURNS = _env_int("CONTEXT_MAX_TURNS", 0)
+
+# Turnos fuera de la ventana que se acumulan antes de actualizar el resumen
+CONTEXT_SUMMARY_BATCH_TURNS = _env_int("CONTEXT_SUMMARY_BATCH_TURNS", 4)
+
+# Prompt por recuperación: secciones del catálogo incluidas en cada turno (0 =
+# prompt completo) y mensajes recientes del cliente usados como consulta
+PROMPT_RETRIEVAL_TOP_K = _env_int("PROMPT_RETRIEVAL_TOP_K", 0)
+PROMPT_RETRIEVAL_QUERY_TURNS = _env_int("PROMPT_RETRIEVAL_QUERY_TURNS", 3)
+
+# Caché de respuestas exactas (0 = desactivada)
+RESPONSE_CACHE_MAX_ENTRIES = _env_int("RESPONSE_CACHE_MAX_ENTRIES", 0)
+RESPONSE_CACHE_TTL_SECONDS = _env_float("RESPONSE_CACHE_TTL_SECONDS", 3600)
+
+# Caché semántica de preguntas parecidas en el primer turno (0 = desactivada)
+SEMANTIC_CACHE_MAX_ENTRIES = _env_int("SEMANTIC_CACHE_MAX_ENTRIES", 0)
+# Umbral elegido con benchmarks/eval_semantic_cache.py
+SEMANTIC_CACHE_THRESHOLD = _env_float("SEMANTIC_CACHE_THRESHOLD", 0.80)
+SEMANTIC_CACHE_TTL_SECONDS = _env_float("SEMANTIC_CACHE_TTL_SECONDS", 3600)
+# Fracción de aciertos que se verifican con el modelo para medir falsos aciertos
+SEMANTIC_CACHE_VERIFY_RATE = _env_float("SEMANTIC_CACHE_VERIFY_RATE", 0.05)
+
+# Ruta rápida: saludos y preguntas fuera de seguros se responden sin llamar al modelo
+FAST_PATH_ENABLED = _env_bool("FAST_PATH_ENABLED", False)
+# Preguntas directas de precio, cobertura y contacto respondidas desde el catálogo
+CATALOG_LOOKUP_ENABLED = _env_bool("CATALOG_LOOKUP_ENABLED", False)
+
+# Agrupar llamadas idénticas al modelo que están en curso a la vez (opcional, como las demás optimizaciones)
+LLM_SINGLE_FLIGHT = _env_bool("LLM_SINGLE_FLIGHT", False)
+
+# Control de admisión de /chat (0 = sin límite de concurrencia)
+MAX_CONCURRENT_CHATS = _env_int("MAX_CONCURRENT_CHATS", 0)
+MAX_QUEUED_CHATS = _env_int("MAX_QUEUED_CHATS", 100)
+# Debe ser menor que el timeout de los clientes (30 s) para rechazar a tiempo
+QUEUE_TIMEOUT_SECONDS = _env_float("QUEUE_TIMEOUT_SECONDS", 20)
+
+# /chat/batch: mensajes procesados en paralelo por lote y tamaño máximo del lote
+BATCH_MAX_CONCURRENCY = _env_int("BATCH_MAX_CONCURRENCY", 8)
+BATCH_MAX_ITEMS = _env_int("BATCH_MAX_ITEMS", 1000)
+
+# Micro-batching de llamadas al modelo (0 = desactivado)
+LLM_BATCH_WINDOW_MS = _env_float("LLM_BATCH_WINDOW_MS", 0)
+LLM_BATCH_MAX_SIZE = _env_int("LLM_BATCH_MAX_SIZE", 16)
+
+# A partir de cuántos mensajes la respuesta de /history se codifica en un hilo
+HISTORY_OFFLOAD_MESSAGES = _env_int("HISTORY_OFFLOAD_MESSAGES", 64)
+
+# Respuestas de /history ya codificadas, por versión de la conversación (0 = sin caché)
+HISTORY_CACHE_MAX_ENTRIES = _env_int("HISTORY_CACHE_MAX_ENTRIES", 128)
+
+# Procesos worker de uvicorn (más de 1 requiere CHECKPOINTER_BACKEND=sqlite)
+WORKERS = _env_int("WORKERS", 1)
+
+# Locks por thread_id entre procesos: directorio de archivos de lock (vacío =
+# junto a la base SQLite cuando WORKERS > 1) y número de archivos
+THREAD_LOCK_DIR = os.environ.get("THREAD_LOCK_DIR", "") or (
+    f"{SQLITE_CHECKPOINT_PATH}.locks" if WORKERS > 1 else ""
+)
+THREAD_LOCK_STRIPES = _env_int("THREAD_LOCK_STRIPES", 1024)
+
+# Router con afinidad por thread_id (router.py): nodos de la API separados por
+# comas, puntos virtuales por nodo en el anillo y segundos que un nodo caído
+# queda fuera antes de volver a intentarlo
+ROUTER_NODES = [node.strip().rstrip("/") for node in os.environ.get("ROUTER_NODES", "").split(",") if node.strip()]
+ROUTER_VIRTUAL_NODES = _env_int("ROUTER_VIRTUAL_NODES", 160)
+ROUTER_NODE_COOLDOWN_SECONDS = _env_float("ROUTER_NODE_COOLDOWN_SECONDS", 5)
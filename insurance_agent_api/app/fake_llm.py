@@ -0,0 +1,212 @@
+"""
+Modelo de chat simulado para pruebas de carga sin red ni API key.
+
+Se activa con LLM_BACKEND=fake. Responde de forma determinista (misma
+pregunta, misma respuesta) con latencia configurable y streaming token a
+token, de modo que se puede medir toda la pila FastAPI + LangGraph en una
+máquina aislada sin gastar cuota de Gemini.
+
+Las respuestas se eligen en este orden:
+1. Respuesta grabada (replay) cuya pregunta coincide con el último mensaje
+2. Respuesta predefinida cuya palabra clave aparece en el último mensaje
+3. Respuesta por defecto
+"""
+
+import asyncio
+import json
+import math
+import random
+import re
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import Field, PrivateAttr
+
+from cache import message_text, normalize_message
+from config import (
+    FAKE_LLM_ANSWERS_PATH,
+    FAKE_LLM_LATENCY_DISTRIBUTION,
+    FAKE_LLM_LATENCY_JITTER_MS,
+    FAKE_LLM_LATENCY_MS,
+    FAKE_LLM_REPLAY_PATH,
+    FAKE_LLM_SEED,
+    FAKE_LLM_TOKEN_DELAY_MS,
+)
+
+# Respuestas predefinidas por palabra clave (en orden de prioridad)
+DEFAULT_CANNED_ANSWERS = {
+    "auto": "El Seguro de Auto de SegurosVida+ incluye asistencia en carretera 24/7, auto de reemplazo y cobertura a terceros. Desde $45/mes.",
+    "vida": "El Seguro de Vida cubre desde $50,000 hasta $1,000,000, con beneficiarios ilimitados. Desde $25/mes.",
+    "hogar": "El Seguro de Hogar protege contra incendios, robos e inundaciones, con responsabilidad civil incluida. Desde $35/mes.",
+    "salud": "El Seguro de Salud da acceso a más de 500 clínicas, cobertura dental y chequeos anuales gratuitos. Desde $80/mes.",
+    "viaje": "El Seguro de Viaje incluye asistencia médica en el extranjero, cancelación de vuelos y pérdida de equipaje. Desde $15 por viaje.",
+    "contact": "Puedes contactarnos al 1-800-SEGVIDA (1-800-734-8432), por email a contacto@segurosvida.com o por WhatsApp al +57 300 123 4567.",
+    "seguros": "En SegurosVida+ ofrecemos seguros de vida, auto, hogar, salud y viaje. ¿Sobre cuál te gustaría saber más?",
+    "hola": "¡Hola! Soy el asistente virtual de SegurosVida+. ¿En qué seguro te puedo ayudar hoy?",
+}
+
+DEFAULT_ANSWER = "Gracias por tu mensaje. En SegurosVida+ te ayudamos con seguros de vida, auto, hogar, salud y viaje. ¿Qué te gustaría saber?"
+
+
+def load_replay(path: str) -> Dict[str, str]:
+    """
+    Carga respuestas grabadas desde un archivo JSONL.
+    
+    Cada línea es un objeto con `input` (pregunta del usuario) y `output`
+    (respuesta). Si una pregunta aparece varias veces se usa la última.
+    """
+    responses = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if "input" in record and "output" in record:
+                responses[normalize_message(record["input"])] = record["output"]
+    return responses
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Modelo determinista con latencia configurable.
+    
+    La latencia hasta el primer token se muestrea de la distribución
+    `latency_distribution` ("constant", "uniform", "normal", "lognormal" o
+    "exponential") con media `latency_ms` y dispersión `latency_jitter_ms`.
+    En streaming, cada token posterior tarda `token_delay_ms`.
+    """
+    
+    latency_distribution: str = "constant"
+    latency_ms: float = 500.0
+    latency_jitter_ms: float = 0.0
+    token_delay_ms: float = 0.0
+    canned_answers: Dict[str, str] = Field(default_factory=lambda: dict(DEFAULT_CANNED_ANSWERS))
+    default_answer: str = DEFAULT_ANSWER
+    replay: Dict[str, str] = Field(default_factory=dict)
+    seed: Optional[int] = None
+    
+    _random: random.Random = PrivateAttr()
+    
+    def model_post_init(self, __context: Any) -> None:
+        self._random = random.Random(self.seed)
+    
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+    
+    def sample_latency(self) -> float:
+        """Latencia hasta el primer token, en segundos."""
+        mean = self.latency_ms / 1000
+        jitter = self.latency_jitter_ms / 1000
+        distribution = self.latency_distribution
+        if distribution == "constant" or mean <= 0:
+            value = mean
+        elif distribution == "uniform":
+            value = self._random.uniform(mean - jitter, mean + jitter)
+        elif distribution == "normal":
+            value = self._random.gauss(mean, jitter)
+        elif distribution == "lognormal":
+            # Parámetros de la normal subyacente para obtener esa media y desviación
+            sigma = math.sqrt(math.log(1 + (jitter / mean) ** 2))
+            mu = math.log(mean) - sigma ** 2 / 2
+            value = self._random.lognormvariate(mu, sigma)
+        elif distribution == "exponential":
+            value = self._random.expovariate(1 / mean)
+        else:
+            raise ValueError(f"Distribución de latencia desconocida: {distribution!r}")
+        return max(value, 0.0)
+    
+    def answer_for(self, messages: List[BaseMessage]) -> str:
+        """Respuesta determinista para la conversación."""
+        question = next((m for m in reversed(messages) if m.type == "human"), None)
+        text = normalize_message(message_text(question)) if question else ""
+        if text in self.replay:
+            return self.replay[text]
+        for keyword, answer in self.canned_answers.items():
+            if keyword in text:
+                return answer
+        return self.default_answer
+    
+    @staticmethod
+    def _tokens(text: str) -> List[str]:
+        return re.findall(r"\S+\s*", text)
+    
+    def _usage(self, messages: List[BaseMessage], text: str) -> Dict[str, int]:
+        # Aproximación: un token por palabra
+        input_tokens = sum(len(self._tokens(message_text(m))) for m in messages)
+        output_tokens = len(self._tokens(text))
+        return {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+    
+    def _message(self, messages: List[BaseMessage], text: str) -> AIMessage:
+        return AIMessage(content=text, usage_metadata=self._usage(messages, text))
+    
+    def _chunks(self, messages: List[BaseMessage], text: str) -> Iterator[ChatGenerationChunk]:
+        tokens = self._tokens(text)
+        for i, token in enumerate(tokens):
+            # El último fragmento lleva el uso de tokens de toda la respuesta
+            usage = self._usage(messages, text) if i == len(tokens) - 1 else None
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token, usage_metadata=usage))
+    
+    def _total_latency(self, text: str) -> float:
+        return self.sample_latency() + self.token_delay_ms / 1000 * max(len(self._tokens(text)) - 1, 0)
+    
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        text = self.answer_for(messages)
+        time.sleep(self._total_latency(text))
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages, text))])
+    
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        text = self.answer_for(messages)
+        await asyncio.sleep(self._total_latency(text))
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages, text))])
+    
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        text = self.answer_for(messages)
+        time.sleep(self.sample_latency())
+        for i, chunk in enumerate(self._chunks(messages, text)):
+            if i:
+                time.sleep(self.token_delay_ms / 1000)
+            yield chunk
+    
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        text = self.answer_for(messages)
+        await asyncio.sleep(self.sample_latency())
+        for i, chunk in enumerate(self._chunks(messages, text)):
+            if i:
+                await asyncio.sleep(self.token_delay_ms / 1000)
+            yield chunk
+
+
+def create_fake_llm(factory: Callable[..., FakeChatModel] = FakeChatModel, **kwargs: Any) -> FakeChatModel:
+    """
+    Crea el modelo simulado con la configuración FAKE_LLM_* del entorno.
+    
+    Args:
+        factory: Clase (o constructor) del modelo, por si se usa una subclase
+        **kwargs: Argumentos adicionales para `factory`
+    """
+    if FAKE_LLM_ANSWERS_PATH:
+        with open(FAKE_LLM_ANSWERS_PATH, encoding="utf-8") as f:
+            kwargs["canned_answers"] = {normalize_message(k): v for k, v in json.load(f).items()}
+    if FAKE_LLM_REPLAY_PATH:
+        kwargs["replay"] = load_replay(FAKE_LLM_REPLAY_PATH)
+    return factory(
+        latency_distribution=FAKE_LLM_LATENCY_DISTRIBUTION,
+        latency_ms=FAKE_LLM_LATENCY_MS,
+        latency_jitter_ms=FAKE_LLM_LATENCY_JITTER_MS,
+        token_delay_ms=FAKE_LLM_TOKEN_DELAY_MS,
+        seed=int(FAKE_LLM_SEED) if FAKE_LLM_SEED is not None else None,
+        **kwargs
+    )
@@ -0,0 +1,135 @@
+"""
+Ruta rápida: respuestas deterministas a saludos y preguntas fuera de seguros.
+
+El prompt del sistema ya fija qué responder en estos casos (saludar y
+redirigir a seguros, o la respuesta estándar de restricción), así que no
+hace falta pagar una llamada al modelo para obtenerlo. Un clasificador de
+palabras clave decide en microsegundos:
+
+- greeting: el mensaje solo contiene un saludo ("hola", "buenos días, ¿qué tal?")
+- off_topic: menciona un tema ajeno (fútbol, recetas, política,
+  programación...) y ninguna palabra relacionada con seguros
+- None: cualquier otro caso, que responde el modelo
+
+Con el catálogo activado (CATALOG_LOOKUP_ENABLED), las preguntas directas
+de precio, cobertura y contacto se responden desde catalog.CatalogIndex.
+
+Ante la duda el mensaje va al modelo: una palabra de seguros en el mensaje
+basta para descartar la ruta rápida. Así un error del clasificador solo
+cuesta una llamada al modelo, nunca una negativa a una pregunta válida.
+La precisión y la cobertura se miden con benchmarks/eval_fast_path.py.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from cache import message_words
+from catalog import CatalogIndex
+from prompts import GREETING_RESPONSE, OFF_TOPIC_RESPONSE
+
+GREETING = "greeting"
+OFF_TOPIC = "off_topic"
+CATALOG = "catalog"
+
+RESPONSES = {
+    GREETING: GREETING_RESPONSE,
+    OFF_TOPIC: OFF_TOPIC_RESPONSE,
+}
+
+# Palabras que por sí solas forman un saludo; al menos una de las primeras
+# debe aparecer ("qué tal" sí, "todo bien" no)
+_GREETING_ANCHORS = frozenset("hola holi buenas buenos buen saludos hey hi hello ey tal estas".split())
+_GREETING_WORDS = _GREETING_ANCHORS | frozenset("""
+dia dias tarde tardes noche noches que como esta estan va todo bien muy y usted ustedes
+""".split())
+_GREETING_MAX_WORDS = 8
+
+# Raíces relacionadas con seguros: si aparece alguna, responde el modelo
+_INSURANCE_STEMS = tuple("""
+segur asegur poliz cobert cubr prima deducib franquic siniestr reclam indemniz benefici
+cotiz precio cuest cuant vale valor pag mensual anual tarifa plan descuent
+vida muert fallec auto carro coche vehic moto hogar casa vivienda apartament
+salud medic clinic hospital dental oftalm
+viaj equipaje vuelo
+contact telefon whatsapp correo email oficina asesor agente app aplicacion cliente
+accident robo incendi inundac tercer asistencia emergencia cancel
+familia hijo esposa mascota cita consult doctor urgencia dentist odontolog lentes
+cost dinero requisit tramit document renov empresa
+""".split())
+
+# Raíces de temas ajenos a seguros (política, deportes, cocina, programación...).
+# Se evitan raíces ambiguas: "liga" también es "ligamento" y "program", "programar una cita"
+_OFF_TOPIC_STEMS = tuple("""
+futbol partido goles goleador champions deporte baloncesto basket nba tenis beisbol
+receta cocin pizza hornear ingrediente
+politic president elecc congreso gobiern votar senador alcalde
+programacion programador python javascript codigo html sql algoritm
+pelicula netflix musica cancion cantante album
+chiste poema horoscopo clima criptomoneda bitcoin
+videojuego
+matemat ecuacion derivada
+""".split())
+
+
+def _has_stem(words: List[str], stems: tuple) -> bool:
+    return any(word.startswith(stems) for word in words)
+
+
+def classify(text: str) -> Optional[str]:
+    """
+    Clasifica un mensaje del usuario.
+    
+    Returns:
+        GREETING, OFF_TOPIC o None si debe responder el modelo
+    """
+    words = message_words(text)
+    if not words:
+        return None
+    if (len(words) <= _GREETING_MAX_WORDS
+            and all(word in _GREETING_WORDS for word in words)
+            and any(word in _GREETING_ANCHORS for word in words)):
+        return GREETING
+    if _has_stem(words, _INSURANCE_STEMS):
+        return None
+    if _has_stem(words, _OFF_TOPIC_STEMS):
+        return OFF_TOPIC
+    return None
+
+
+class FastPath:
+    """
+    Decide si un mensaje se responde sin el modelo y cuenta las decisiones.
+    
+    Args:
+        rules: Responder saludos y preguntas fuera de tema (classify)
+        catalog: Índice del catálogo para preguntas directas de precio,
+            cobertura y contacto (None = sin catálogo)
+    """
+    
+    def __init__(self, rules: bool = True, catalog: Optional[CatalogIndex] = None):
+        self.rules = rules
+        self.catalog = catalog
+        self.decisions: Dict[str, int] = {GREETING: 0, OFF_TOPIC: 0, CATALOG: 0, "llm": 0}
+    
+    def answer(self, text: str) -> Tuple[str, Optional[str]]:
+        """
+        Returns:
+            (decisión, respuesta); la respuesta es None si debe responder el modelo
+        """
+        label = classify(text) if self.rules else None
+        response = RESPONSES[label] if label else None
+        if response is None and self.catalog is not None:
+            response = self.catalog.lookup(text)
+            label = CATALOG if response is not None else None
+        label = label or "llm"
+        self.decisions[label] += 1
+        return label, response
+    
+    def stats(self) -> Dict[str, Any]:
+        total = sum(self.decisions.values())
+        answered = total - self.decisions["llm"]
+        return {
+            "rules": self.rules,
+            "catalog": self.catalog is not None,
+            "decisions": dict(self.decisions),
+            "answered_ratio": round(answered / total, 4) if total else None,
+        }
@@ -3,32 +3,68 @@ API FastAPI para el agente de seguros con memoria.
 """
 
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import hashlib
+import json
 import os
 from agent import InsuranceAgent
+from cache import ResponseCache
+from cassette import cassette_stats
+import metrics
+from metrics import MetricsMiddleware
+from tracing import REQUEST_ID_HEADER, RequestContextMiddleware, setup_tracing, shutdown_tracing
+from checkpointers import open_checkpointer
+from concurrency import AdmissionController, QueueFullError
+from config import (
+    BATCH_MAX_CONCURRENCY,
+    BATCH_MAX_ITEMS,
+    CHECKPOINTER_BACKEND,
+    HISTORY_CACHE_MAX_ENTRIES,
+    HISTORY_OFFLOAD_MESSAGES,
+    LLM_BACKEND,
+    MAX_CONCURRENT_CHATS,
+    MAX_QUEUED_CHATS,
+    QUEUE_TIMEOUT_SECONDS,
+    THREAD_LOCK_DIR,
+    TRACING_EXPORTER,
+    WORKERS,
+)
 
 # Instancia global del agente
 agent: Optional[InsuranceAgent] = None
 
+# Límite de conversaciones procesadas a la vez, con cola de espera acotada
+admission = AdmissionController(MAX_CONCURRENT_CHATS, MAX_QUEUED_CHATS, QUEUE_TIMEOUT_SECONDS)
+metrics.track_admission(admission.stats)
+
+# Respuestas de /history ya codificadas, indexadas por ETag (versión + paginación)
+history_cache = ResponseCache(HISTORY_CACHE_MAX_ENTRIES, ttl=0) if HISTORY_CACHE_MAX_ENTRIES > 0 else None
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     global agent
-    try:
-        agent = InsuranceAgent()
-        print("✅ Agente de seguros inicializado correctamente")
-    except Exception as e:
-        print(f"❌ Error al inicializar el agente: {e}")
-        print("Verifica que GOOGLE_API_KEY esté configurada en el archivo .env")
-        raise
-    
-    yield
-    
-    # Shutdown
-    print("🔄 Cerrando agente de seguros")
+    if setup_tracing():
+        print(f"🔭 Trazas activadas (exportador: {TRACING_EXPORTER})")
+    async with open_checkpointer() as checkpointer:
+        try:
+            agent = InsuranceAgent(checkpointer=metrics.instrument_checkpointer(checkpointer))
+            print(f"✅ Agente de seguros inicializado correctamente (modelo: {LLM_BACKEND}, checkpointer: {CHECKPOINTER_BACKEND})")
+        except Exception as e:
+            print(f"❌ Error al inicializar el agente: {e}")
+            print("Verifica que GOOGLE_API_KEY esté configurada en el archivo .env (o usa LLM_BACKEND=fake)")
+            raise
+        
+        yield
+        
+        # Shutdown
+        print("🔄 Cerrando agente de seguros")
+    shutdown_tracing()
 
 app = FastAPI(
     title="SegurosVida+ API",
@@ -37,6 +73,12 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Latencia por endpoint y peticiones en curso para /metrics
+app.add_middleware(MetricsMiddleware)
+
+# ID de petición (X-Request-ID) y span raíz de cada petición
+app.add_middleware(RequestContextMiddleware)
+
 # Configurar CORS para permitir requests desde frontends
 app.add_middleware(
     CORSMiddleware,
@@ -44,6 +86,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[REQUEST_ID_HEADER, "ETag"],  # Legibles desde el navegador
 )
 
 # Modelos para requests y responses
@@ -55,8 +98,14 @@ class ChatResponse(BaseModel):
     response: str
     thread_id: str
 
+class BatchChatRequest(BaseModel):
+    items: List[ChatRequest]
+    max_concurrency: Optional[int] = None
+
 class HistoryResponse(BaseModel):
     history: List[Dict[str, Any]]
+    total: Optional[int] = None
+    start: Optional[int] = None
 
 
 @app.get("/")
@@ -68,12 +117,23 @@ async def root():
         "description": "Asistente virtual de seguros con memoria conversacional",
         "endpoints": {
             "chat": "/chat",
+            "chat_stream": "/chat/stream",
+            "chat_batch": "/chat/batch",
             "history": "/history/{thread_id}",
             "health": "/health",
+            "metrics": "/metrics",
             "docs": "/docs"
         }
     }
 
+def _busy_error(error: QueueFullError) -> HTTPException:
+    """Respuesta 429 con Retry-After cuando el servidor está saturado."""
+    return HTTPException(
+        status_code=429,
+        detail="Servidor ocupado, intenta nuevamente en unos segundos",
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """
@@ -88,17 +148,161 @@ async def chat(request: ChatRequest):
         raise HTTPException(status_code=500, detail="Agente no inicializado")
     
     try:
-        result = await agent.chat(request.message, request.thread_id)
+        async with admission.slot():
+            result = await agent.chat(request.message, request.thread_id)
         return ChatResponse(**result)
+    except QueueFullError as e:
+        metrics.record_error("/chat", e)
+        raise _busy_error(e)
     except Exception as e:
+        metrics.record_error("/chat", e)
         raise HTTPException(status_code=500, detail=f"Error al procesar mensaje: {str(e)}")
 
+class _AdmittedStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse que libera su hueco de admisión al terminar.
+    
+    Si el cliente se desconecta antes de que empiece el cuerpo, el generador
+    nunca arranca y su `finally` no se ejecuta; por eso la liberación se
+    hace también aquí, pase lo que pase al enviar la respuesta.
+    """
+    
+    def __init__(self, content: Any, release: Callable[[], None], **kwargs: Any):
+        super().__init__(content, **kwargs)
+        self._release = release
+    
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._release()
+
+def _sse_event(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    """Formatea un evento Server-Sent Events con datos JSON."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Igual que /chat, pero transmite la respuesta token a token (Server-Sent Events).
+    
+    Cada fragmento llega como `data: {"token": "..."}`. Al terminar se envía
+    `event: end` con el thread_id; si algo falla se envía `event: error`.
+    La respuesta completa queda guardada en el historial del hilo.
+    """
+    global agent
+    
+    if agent is None:
+        raise HTTPException(status_code=500, detail="Agente no inicializado")
+    
+    # La admisión se decide antes de abrir el stream para poder responder 429
+    try:
+        admitted_at = await admission.acquire()
+    except QueueFullError as e:
+        metrics.record_error("/chat/stream", e)
+        raise _busy_error(e)
+    
+    released = False
+    
+    def release() -> None:
+        # El generador y la respuesta la llaman; solo cuenta la primera vez
+        nonlocal released
+        if not released:
+            released = True
+            admission.release(admitted_at)
+    
+    async def event_stream():
+        try:
+            async for token in agent.chat_stream(request.message, request.thread_id):
+                yield _sse_event({"token": token})
+            yield _sse_event({"thread_id": request.thread_id}, event="end")
+        except Exception as e:
+            metrics.record_error("/chat/stream", e)
+            yield _sse_event({"detail": f"Error al procesar mensaje: {str(e)}"}, event="error")
+        finally:
+            release()
+    
+    return _AdmittedStreamingResponse(
+        event_stream(),
+        release,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/chat/batch")
+async def chat_batch(request: BatchChatRequest):
+    """
+    Procesa una lista de mensajes {message, thread_id} en paralelo.
+    
+    Pensado para flujos salientes y pruebas de QA con cientos de mensajes.
+    Los resultados se devuelven como NDJSON (un objeto JSON por línea) en
+    orden de finalización, con el campo `index` de la posición en la lista;
+    un mensaje lento no retrasa a los demás. Los mensajes del mismo
+    thread_id se procesan en orden.
+    """
+    global agent
+    
+    if agent is None:
+        raise HTTPException(status_code=500, detail="Agente no inicializado")
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"El lote supera el máximo de {BATCH_MAX_ITEMS} mensajes")
+    
+    fan_out = min(request.max_concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY)
+    semaphore = asyncio.Semaphore(max(fan_out, 1))
+    
+    async def run_item(index: int, item: ChatRequest) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                # Los lotes ya limitan su concurrencia: esperan turno sin ocupar la cola de /chat
+                async with admission.slot(bounded=False):
+                    result = await agent.chat(item.message, item.thread_id)
+                return {"index": index, **result}
+            except Exception as e:
+                metrics.record_error("/chat/batch", e)
+                return {"index": index, "thread_id": item.thread_id, "error": f"Error al procesar mensaje: {str(e)}"}
+    
+    async def results():
+        tasks = [asyncio.create_task(run_item(i, item)) for i, item in enumerate(request.items)]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield json.dumps(await finished, ensure_ascii=False) + "\n"
+        finally:
+            # Si el cliente se desconecta, no seguir procesando el resto del lote
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+def _history_etag(version: Optional[str], *params: Optional[int]) -> str:
+    """ETag fuerte: versión del checkpoint más los parámetros de paginación."""
+    key = f"{version or 'empty'}|" + "|".join(str(p) for p in params)
+    return '"' + hashlib.sha256(key.encode("utf-8")).hexdigest()[:32] + '"'
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
 @app.get("/history/{thread_id}", response_model=HistoryResponse)
-async def get_history(thread_id: str):
+async def get_history(
+    thread_id: str,
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, description="Máximo de mensajes a devolver"),
+    before: Optional[int] = Query(None, ge=0, description="Solo mensajes con posición menor (páginas anteriores)"),
+    since: Optional[int] = Query(None, ge=0, description="Solo mensajes desde esta posición (mensajes nuevos)")
+):
     """
-    Obtiene el historial completo de conversación para un thread_id específico.
+    Obtiene el historial de conversación para un thread_id específico.
+    
+    Sin parámetros devuelve la conversación completa. Con `limit`, `before`
+    y `since` devuelve una página; `start` indica la posición del primer
+    mensaje devuelto y `total` el número de mensajes de la conversación.
     
-    Útil para revisar conversaciones previas o mostrar el historial en el frontend.
+    La respuesta incluye un ETag basado en la versión de la conversación:
+    si el cliente lo envía en `If-None-Match` y no hubo cambios, recibe 304
+    sin cuerpo.
     """
     global agent
     
@@ -106,21 +310,80 @@ async def get_history(thread_id: str):
         raise HTTPException(status_code=500, detail="Agente no inicializado")
     
     try:
-        history = await agent.get_conversation_history(thread_id)
-        return HistoryResponse(history=history)
+        # Comprobación barata antes de leer y serializar los mensajes
+        version = await agent.get_history_version(thread_id)
+        etag = _history_etag(version, limit, before, since)
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        
+        # Conversación sin cambios desde la última lectura: no se vuelve a deserializar
+        cache_key = f"{thread_id}|{etag}"
+        if history_cache is not None:
+            body = history_cache.get(cache_key)
+            metrics.record_cache("history", body is not None)
+            if body is not None:
+                return Response(content=body, media_type="application/json", headers={"ETag": etag})
+        
+        page = await agent.get_history_page(thread_id, limit=limit, before=before, since=since)
+        etag = _history_etag(page["version"], limit, before, since)
+        payload = {"history": page["history"], "total": page["total"], "start": page["start"]}
+        
+        # Las conversaciones largas se codifican en un hilo para no bloquear el event loop
+        if len(page["history"]) > HISTORY_OFFLOAD_MESSAGES:
+            body = await asyncio.to_thread(json.dumps, payload, ensure_ascii=False)
+        else:
+            body = json.dumps(payload, ensure_ascii=False)
+        if history_cache is not None:
+            history_cache.set(f"{thread_id}|{etag}", body)
+        return Response(content=body, media_type="application/json", headers={"ETag": etag})
     except Exception as e:
+        metrics.record_error("/history", e)
         raise HTTPException(status_code=500, detail=f"Error al obtener historial: {str(e)}")
 
+def _process_rss_bytes() -> Optional[int]:
+    """Memoria residente (RSS) actual del proceso, o None si no se puede leer."""
+    try:
+        # Linux: segundo campo de /proc/self/statm, en páginas
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
 @app.get("/health")
 async def health_check():
     """Endpoint de salud para verificar que el servicio está funcionando."""
     return {
         "status": "healthy",
         "service": "SegurosVida+ Insurance Agent API",
-        "agent_ready": agent is not None
+        "agent_ready": agent is not None,
+        "process": {"pid": os.getpid(), "rss_bytes": _process_rss_bytes()},
+        "admission": admission.stats(),
+        "checkpointer": agent.memory.stats() if agent is not None and hasattr(agent.memory, "stats") else None,
+        "response_cache": agent.response_cache.stats() if agent is not None and agent.response_cache else None,
+        "semantic_cache": agent.semantic_cache.stats() if agent is not None and agent.semantic_cache else None,
+        "prompt_retrieval": agent.prompt_assembler.stats() if agent is not None and agent.prompt_assembler else None,
+        "fast_path": agent.fast_path.stats() if agent is not None and agent.fast_path else None,
+        "single_flight": agent.single_flight.stats() if agent is not None and agent.single_flight else None,
+        "micro_batching": agent.micro_batcher.stats() if agent is not None and agent.micro_batcher else None,
+        "thread_locks": agent.thread_locks.stats() if agent is not None else None,
+        "cassette": cassette_stats(agent.llm) if agent is not None else None
     }
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Métricas en formato Prometheus (latencias por etapa, colas, tokens, cachés y errores)."""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE_LATEST)
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    if WORKERS > 1:
+        # Cada worker es un proceso: las conversaciones deben estar en un
+        # almacenamiento compartido, no en la memoria de cada uno
+        if CHECKPOINTER_BACKEND != "sqlite":
+            raise SystemExit("❌ WORKERS > 1 requiere CHECKPOINTER_BACKEND=sqlite")
+        print(f"🚀 Iniciando {WORKERS} workers (locks por hilo en {THREAD_LOCK_DIR})")
+        uvicorn.run("main:app", host="0.0.0.0", port=port, workers=WORKERS)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=port)
@@ -0,0 +1,235 @@
+"""
+Métricas Prometheus de la API (expuestas en GET /metrics).
+
+Separan el tiempo de cada etapa para saber dónde está el cuello de botella:
+
+- seguros_http_request_duration_seconds: latencia total por endpoint
+- seguros_llm_request_duration_seconds: llamadas reales al modelo (Gemini)
+- seguros_graph_overhead_seconds: tiempo del turno fuera del modelo
+  (grafo, checkpointer, cachés, esperas por el lock del hilo)
+- seguros_checkpointer_duration_seconds: operaciones del checkpointer
+
+Si la latencia HTTP sigue a la del modelo, el cuello de botella es Gemini;
+si crece el overhead o la cola de admisión, es nuestro código o la
+capacidad del proceso.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+import tracing
+
+_LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+_FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+REQUEST_LATENCY = Histogram(
+    "seguros_http_request_duration_seconds",
+    "Latencia de las peticiones HTTP hasta el último byte de la respuesta",
+    ["method", "endpoint", "status"],
+    buckets=_LATENCY_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "seguros_http_requests_in_flight",
+    "Peticiones HTTP en curso (incluidas las que esperan en la cola de admisión)",
+)
+LLM_LATENCY = Histogram(
+    "seguros_llm_request_duration_seconds",
+    "Duración de las llamadas al modelo de lenguaje",
+    ["outcome"],
+    buckets=_LATENCY_BUCKETS,
+)
+LLM_TOKENS = Counter(
+    "seguros_llm_tokens_total",
+    "Tokens enviados y recibidos del modelo de lenguaje",
+    ["direction"],
+)
+GRAPH_OVERHEAD = Histogram(
+    "seguros_graph_overhead_seconds",
+    "Tiempo de cada turno del grafo sin contar la espera por el modelo",
+    buckets=_FAST_BUCKETS,
+)
+CHECKPOINTER_LATENCY = Histogram(
+    "seguros_checkpointer_duration_seconds",
+    "Duración de las operaciones del checkpointer",
+    ["operation"],
+    buckets=_FAST_BUCKETS,
+)
+CACHE_LOOKUPS = Counter(
+    "seguros_cache_lookups_total",
+    "Consultas a las cachés por resultado",
+    ["cache", "result"],
+)
+FAST_PATH_DECISIONS = Counter(
+    "seguros_fast_path_decisions_total",
+    "Decisiones de la ruta rápida (greeting, off_topic y catalog se responden sin el modelo)",
+    ["result"],
+)
+ERRORS = Counter(
+    "seguros_errors_total",
+    "Errores por endpoint (o etapa) y tipo",
+    ["endpoint", "type"],
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    "seguros_admission_in_flight",
+    "Conversaciones en proceso dentro del control de admisión",
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "seguros_admission_queue_depth",
+    "Conversaciones esperando en la cola de admisión",
+)
+
+# Segundos de espera por el modelo acumulados en el turno en curso
+_turn_llm_seconds: ContextVar[Optional[List[float]]] = ContextVar("turn_llm_seconds", default=None)
+
+
+def render() -> bytes:
+    """Métricas en formato de texto de Prometheus."""
+    return generate_latest()
+
+
+def track_admission(stats: Callable[[], Dict[str, Any]]) -> None:
+    """Lee la ocupación de la admisión en cada scrape."""
+    ADMISSION_IN_FLIGHT.set_function(lambda: stats()["in_flight"])
+    ADMISSION_QUEUE_DEPTH.set_function(lambda: stats()["queue_depth"])
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def record_fast_path(label: str) -> None:
+    FAST_PATH_DECISIONS.labels(label).inc()
+
+
+def record_error(endpoint: str, error: BaseException) -> None:
+    ERRORS.labels(endpoint, type(error).__name__).inc()
+
+
+async def timed_llm_call(call: Awaitable[Any]) -> Any:
+    """Espera una llamada real al modelo y registra su duración, errores y tokens."""
+    start = time.perf_counter()
+    try:
+        response = await call
+    except Exception as e:
+        LLM_LATENCY.labels("error").observe(time.perf_counter() - start)
+        record_error("llm", e)
+        raise
+    LLM_LATENCY.labels("ok").observe(time.perf_counter() - start)
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage.get("input_tokens"):
+        LLM_TOKENS.labels("in").inc(usage["input_tokens"])
+    if usage.get("output_tokens"):
+        LLM_TOKENS.labels("out").inc(usage["output_tokens"])
+    return response
+
+
+@contextmanager
+def llm_wait() -> Iterator[None]:
+    """Mide la espera por el modelo dentro de un turno (para restarla del overhead)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        waits = _turn_llm_seconds.get()
+        if waits is not None:
+            waits.append(time.perf_counter() - start)
+
+
+@contextmanager
+def graph_turn() -> Iterator[None]:
+    """Mide un turno del grafo y registra su duración sin la espera por el modelo."""
+    waits: List[float] = []
+    token = _turn_llm_seconds.set(waits)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _turn_llm_seconds.reset(token)
+        GRAPH_OVERHEAD.observe(max(time.perf_counter() - start - sum(waits), 0.0))
+
+
+def instrument_checkpointer(saver: Any) -> Any:
+    """
+    Mide las operaciones asíncronas del checkpointer (y abre un span por
+    operación cuando las trazas están activas).
+    
+    Envuelve los métodos de la propia instancia (no crea un proxy) para
+    que el checkpointer conserve su tipo y sus atributos.
+    """
+    operations = {"aget_tuple": "get", "aput": "put", "aput_writes": "put_writes", "alist": "list"}
+    for method, operation in operations.items():
+        original = getattr(saver, method, None)
+        if original is None:
+            continue
+        if method == "alist":
+            setattr(saver, method, _timed_iterator(original, operation))
+        else:
+            setattr(saver, method, _timed(original, operation))
+    return saver
+
+
+def _timed(method: Callable[..., Any], operation: str) -> Callable[..., Any]:
+    histogram = CHECKPOINTER_LATENCY.labels(operation)
+    
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            with tracing.span(f"checkpointer.{operation}"):
+                return await method(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - start)
+    return wrapper
+
+
+def _timed_iterator(method: Callable[..., Any], operation: str) -> Callable[..., Any]:
+    histogram = CHECKPOINTER_LATENCY.labels(operation)
+    
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            with tracing.span(f"checkpointer.{operation}"):
+                async for item in method(*args, **kwargs):
+                    yield item
+        finally:
+            histogram.observe(time.perf_counter() - start)
+    return wrapper
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI que mide cada petición HTTP hasta el último byte.
+    
+    Las respuestas en streaming (/chat/stream, /chat/batch) cuentan hasta
+    que se envía el final del cuerpo. El endpoint se etiqueta con la ruta
+    declarada (/history/{thread_id}) para no crear una serie por hilo.
+    """
+    
+    def __init__(self, app: Any):
+        self.app = app
+    
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        status = {"code": 500}
+        
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+        
+        start = time.perf_counter()
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            route = scope.get("route")
+            endpoint = getattr(route, "path", None) or "otro"
+            REQUEST_LATENCY.labels(scope["method"], endpoint, str(status["code"])).observe(time.perf_counter() - start)
+
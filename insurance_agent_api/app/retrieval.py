@@ -0,0 +1,134 @@
+"""
+Prompt por recuperación: solo las secciones del catálogo relevantes en cada turno.
+
+El prompt completo (~3 KB) se envía en cada llamada aunque el cliente solo
+pregunte por el seguro de viaje. Con PROMPT_RETRIEVAL_TOP_K > 0 el prompt de
+cada turno se arma con las reglas del asistente más las `top_k` secciones
+del catálogo que mejor coinciden con los últimos mensajes del cliente,
+según BM25 sobre un índice local (sin servicios externos). La sección de
+contacto se incluye siempre, porque las instrucciones piden invitar a
+contactar.
+
+Si ninguna sección coincide ("¿y eso?", "gracias"), se envía el prompt
+completo: ante la duda, el modelo ve todo el catálogo.
+"""
+
+import math
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage
+
+from cache import message_text, message_words
+from catalog import catalog_sections
+from prompts import build_system_prompt
+
+# Palabras que aparecen en cualquier pregunta y no ayudan a elegir sección
+_STOPWORDS = frozenset("""
+a al como con cual cuales de del el en es esta este la las lo los me mi mis o para por que quiero
+se su sus te tu tus un una unos unas y yo favor hola porfa porfavor seguro seguros desde hasta
+""".split())
+
+# Longitud de la raíz: "viaje", "viajes" y "viajero" comparten "viaj"
+_STEM_LENGTH = 5
+
+
+def terms(text: str) -> List[str]:
+    """Términos de búsqueda: palabras sin tildes ni palabras vacías, recortadas a su raíz."""
+    return [word[:_STEM_LENGTH] for word in message_words(text) if word not in _STOPWORDS]
+
+
+class SectionIndex:
+    """Índice BM25 en memoria sobre las secciones del catálogo."""
+    
+    def __init__(self, sections: List[Dict[str, Any]], k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids = [section["id"] for section in sections]
+        self._docs = [
+            Counter(terms(section["text"] + " " + " ".join(section.get("keywords", []))))
+            for section in sections
+        ]
+        lengths = [sum(doc.values()) for doc in self._docs]
+        self._length_norm = [
+            k1 * (1 - b + b * length / (sum(lengths) / len(lengths))) for length in lengths
+        ]
+        frequency = Counter(term for doc in self._docs for term in doc)
+        n = len(self._docs)
+        self._idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in frequency.items()}
+    
+    def search(self, query: str, top_k: int) -> List[Tuple[str, float]]:
+        """Las `top_k` secciones con mayor puntuación (solo las que tienen alguna coincidencia)."""
+        # Un término repetido en la consulta pesa más
+        query_terms = [(term, count) for term, count in Counter(terms(query)).items() if term in self._idf]
+        scores = []
+        for section_id, doc, norm in zip(self.ids, self._docs, self._length_norm):
+            score = 0.0
+            for term, count in query_terms:
+                tf = doc.get(term, 0)
+                if tf:
+                    score += count * self._idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            if score > 0:
+                scores.append((section_id, score))
+        scores.sort(key=lambda item: item[1], reverse=True)
+        return scores[:top_k]
+
+
+class PromptAssembler:
+    """
+    Arma el prompt del sistema de cada turno con las secciones recuperadas.
+    
+    Los prompts se construyen una vez por combinación de secciones y se
+    reutilizan (hay pocas combinaciones posibles).
+    
+    Args:
+        top_k: Secciones recuperadas por turno
+        query_turns: Mensajes del cliente que forman la consulta; incluir
+            los anteriores permite resolver "¿y cuánto cuesta?"
+        pinned: Secciones que se incluyen siempre
+    """
+    
+    def __init__(self, top_k: int, query_turns: int = 3, pinned: Sequence[str] = ("contacto",)):
+        sections = catalog_sections()
+        self.top_k = top_k
+        self.query_turns = query_turns
+        self.pinned = tuple(pinned)
+        self.index = SectionIndex([section for section in sections if section["id"] not in self.pinned])
+        self.full_prompt = build_system_prompt()
+        self._prompts: Dict[Tuple[str, ...], str] = {}
+        self.turns = 0
+        self.full_fallbacks = 0
+        self.prompt_chars = 0
+    
+    def select(self, messages: Iterable[BaseMessage]) -> Optional[Tuple[str, ...]]:
+        """Secciones para el turno (None = prompt completo)."""
+        questions = [message_text(m) for m in messages if m.type == "human"][-self.query_turns:]
+        # El mensaje actual pesa más: se repite en la consulta
+        query = " ".join(questions + questions[-1:])
+        hits = self.index.search(query, self.top_k)
+        if not hits:
+            return None
+        return tuple(sorted({section_id for section_id, _ in hits} | set(self.pinned)))
+    
+    def system_prompt(self, messages: Iterable[BaseMessage]) -> str:
+        """Prompt del sistema para la conversación `messages`."""
+        section_ids = self.select(messages)
+        if section_ids is None:
+            prompt = self.full_prompt
+            self.full_fallbacks += 1
+        else:
+            prompt = self._prompts.get(section_ids)
+            if prompt is None:
+                prompt = self._prompts[section_ids] = build_system_prompt(section_ids)
+        self.turns += 1
+        self.prompt_chars += len(prompt)
+        return prompt
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "top_k": self.top_k,
+            "turns": self.turns,
+            "full_prompt_fallbacks": self.full_fallbacks,
+            "avg_prompt_chars": round(self.prompt_chars / self.turns) if self.turns else None,
+            "full_prompt_chars": len(self.full_prompt),
+        }
@@ -0,0 +1,344 @@
+"""
+Router con afinidad por thread_id para varios nodos de la API.
+
+Con varios contenedores seguros-api detrás de una misma dirección, cada
+conversación debe llegar siempre al mismo nodo para aprovechar su estado en
+memoria (checkpointer, cachés, single-flight). Este router reenvía cada
+petición al nodo que le corresponde a su thread_id en un anillo de hashing
+consistente:
+
+- POST /chat y /chat/stream: thread_id del cuerpo JSON ("default" si falta)
+- GET /history/{thread_id}: thread_id de la ruta
+- POST /chat/batch: el lote se reparte entre los nodos y los resultados
+  NDJSON se combinan conservando el `index` original
+- El resto (/health, /metrics, /docs): cualquier nodo activo, por turnos
+
+Al añadir o quitar un nodo solo cambian de nodo las conversaciones que
+ganan o pierde ese nodo (~1/N del total). Si un nodo no acepta conexiones,
+sus conversaciones pasan al siguiente nodo del anillo durante
+ROUTER_NODE_COOLDOWN_SECONDS.
+
+Uso:
+    ROUTER_NODES=http://localhost:8001,http://localhost:8002 PORT=8000 python router.py
+"""
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from typing import Optional, List, Dict, Any, Iterable, Iterator
+import asyncio
+import bisect
+import hashlib
+import json
+import os
+import time
+import httpx
+from config import (
+    BATCH_MAX_ITEMS,
+    ROUTER_NODE_COOLDOWN_SECONDS,
+    ROUTER_NODES,
+    ROUTER_VIRTUAL_NODES,
+)
+
+# Cabecera de la respuesta con el nodo que atendió la petición
+UPSTREAM_HEADER = "X-Upstream-Node"
+
+# Cabeceras propias de cada conexión, que no se reenvían
+_HOP_BY_HOP = {
+    "connection", "keep-alive", "proxy-connection", "te", "trailer",
+    "transfer-encoding", "upgrade", "host", "content-length",
+}
+
+# Errores en los que la petición no llegó al nodo y se puede reintentar en otro
+_NOT_DELIVERED = (httpx.ConnectError, httpx.ConnectTimeout)
+
+
+def _hash(key: str) -> int:
+    """Hash estable entre procesos y reinicios (hash() cambia en cada proceso)."""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Anillo de hashing consistente con nodos virtuales.
+    
+    Cada nodo ocupa `virtual_nodes` puntos del anillo y una clave pertenece
+    al nodo del primer punto a su derecha. Con más puntos por nodo la carga
+    se reparte de forma más pareja.
+    """
+    
+    def __init__(self, nodes: Iterable[str] = (), virtual_nodes: int = 160):
+        self.virtual_nodes = virtual_nodes
+        self.nodes: List[str] = []
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        for node in nodes:
+            self.add(node)
+    
+    def add(self, node: str) -> None:
+        if node in self.nodes:
+            return
+        self.nodes.append(node)
+        for i in range(self.virtual_nodes):
+            point = _hash(f"{node}#{i}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+    
+    def remove(self, node: str) -> None:
+        if node not in self.nodes:
+            return
+        self.nodes.remove(node)
+        kept = [(point, owner) for point, owner in zip(self._points, self._owners) if owner != node]
+        self._points = [point for point, _ in kept]
+        self._owners = [owner for _, owner in kept]
+    
+    def node_for(self, key: str) -> str:
+        """Nodo dueño de `key`."""
+        return next(self.nodes_for(key))
+    
+    def nodes_for(self, key: str) -> Iterator[str]:
+        """Nodos distintos en el orden del anillo a partir de `key` (el primero es el dueño)."""
+        if not self._points:
+            raise LookupError("El anillo no tiene nodos")
+        start = bisect.bisect(self._points, _hash(key))
+        seen = set()
+        for i in range(len(self._points)):
+            owner = self._owners[(start + i) % len(self._points)]
+            if owner not in seen:
+                seen.add(owner)
+                yield owner
+                if len(seen) == len(self.nodes):
+                    return
+
+
+class NodeRouter:
+    """
+    Elige el nodo de cada petición y aparta temporalmente los nodos caídos.
+    
+    Un nodo caído no se quita del anillo: sus conversaciones van al
+    siguiente nodo mientras dura el enfriamiento y vuelven a él después,
+    sin mover las del resto de nodos.
+    """
+    
+    def __init__(self, nodes: Iterable[str], virtual_nodes: int = 160, cooldown: float = 5.0):
+        self.ring = HashRing(nodes, virtual_nodes)
+        self.cooldown = cooldown
+        self.routed = {node: 0 for node in self.ring.nodes}
+        self.failovers = 0
+        self._down_until: Dict[str, float] = {}
+        self._next = 0
+    
+    def is_up(self, node: str) -> bool:
+        return self._down_until.get(node, 0) <= time.monotonic()
+    
+    def mark_down(self, node: str) -> None:
+        self._down_until[node] = time.monotonic() + self.cooldown
+        self.failovers += 1
+    
+    def candidates(self, thread_id: Optional[str]) -> List[str]:
+        """Nodos a intentar en orden: el dueño del hilo y después sus sucesores."""
+        if thread_id is None:
+            # Sin conversación no hay afinidad: se reparte por turnos
+            self._next = (self._next + 1) % len(self.ring.nodes)
+            nodes = self.ring.nodes[self._next:] + self.ring.nodes[:self._next]
+        else:
+            nodes = list(self.ring.nodes_for(thread_id))
+        # Si todos parecen caídos se intentan igualmente, en el mismo orden
+        return [node for node in nodes if self.is_up(node)] or nodes
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "virtual_nodes": self.ring.virtual_nodes,
+            "cooldown_seconds": self.cooldown,
+            "failovers": self.failovers,
+            "nodes": [
+                {"url": node, "up": self.is_up(node), "routed": self.routed[node]}
+                for node in self.ring.nodes
+            ],
+        }
+
+
+def thread_id_for(path: str, body: bytes) -> Optional[str]:
+    """thread_id de una petición a la API (None si la ruta no es de una conversación)."""
+    if path.startswith("/history/"):
+        return path[len("/history/"):]
+    if path in ("/chat", "/chat/stream"):
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return None
+        if isinstance(data, dict):
+            return str(data.get("thread_id") or "default")
+    return None
+
+
+# Nodos configurados y cliente HTTP compartido (se crea al arrancar)
+node_router = NodeRouter(ROUTER_NODES, ROUTER_VIRTUAL_NODES, ROUTER_NODE_COOLDOWN_SECONDS)
+client: Optional[httpx.AsyncClient] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global client
+    if not node_router.ring.nodes:
+        raise RuntimeError("ROUTER_NODES está vacío: indica las URLs de los nodos separadas por comas")
+    # Sin timeout de lectura: /chat/stream y /chat/batch pueden durar minutos
+    client = httpx.AsyncClient(timeout=httpx.Timeout(None, connect=2.0), limits=httpx.Limits(max_connections=None))
+    print(f"✅ Router iniciado con {len(node_router.ring.nodes)} nodos: {', '.join(node_router.ring.nodes)}")
+    yield
+    await client.aclose()
+
+app = FastAPI(
+    title="SegurosVida+ Router",
+    description="Reparte las conversaciones entre nodos de la API con hashing consistente",
+    version="1.0.0",
+    lifespan=lifespan
+)
+
+def _forward_headers(request: Request) -> Dict[str, str]:
+    return {key: value for key, value in request.headers.items() if key.lower() not in _HOP_BY_HOP}
+
+@app.get("/router/health")
+async def router_health():
+    """Estado del router y de cada nodo (consulta /health de todos en paralelo)."""
+    async def node_health(node: str) -> Dict[str, Any]:
+        try:
+            response = await client.get(f"{node}/health", timeout=2.0)
+            return {"healthy": response.status_code == 200 and response.json().get("agent_ready", False)}
+        except (httpx.HTTPError, ValueError) as e:
+            return {"healthy": False, "error": type(e).__name__}
+    
+    stats = node_router.stats()
+    checks = await asyncio.gather(*(node_health(node["url"]) for node in stats["nodes"]))
+    for node, check in zip(stats["nodes"], checks):
+        node.update(check)
+    return {"status": "healthy" if any(node["healthy"] for node in stats["nodes"]) else "degraded", **stats}
+
+@app.post("/chat/batch")
+async def chat_batch(request: Request):
+    """
+    Reparte un lote entre los nodos dueños de cada thread_id.
+    
+    Cada nodo recibe un sub-lote con sus mensajes; los resultados se
+    devuelven como NDJSON a medida que llegan de cualquier nodo, con el
+    `index` de la posición en el lote original.
+    """
+    body = await request.body()
+    try:
+        data = json.loads(body)
+        items = data["items"]
+        if not isinstance(items, list):
+            raise TypeError
+    except (ValueError, KeyError, TypeError):
+        # Cuerpo inválido: que lo valide (y rechace) cualquier nodo
+        return await _proxy(request, body, None)
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"El lote supera el máximo de {BATCH_MAX_ITEMS} mensajes")
+    
+    headers = _forward_headers(request)
+    results: asyncio.Queue = asyncio.Queue()
+    tasks: List[asyncio.Task] = []
+    
+    def thread_of(index: int) -> str:
+        item = items[index]
+        return str(item.get("thread_id") or "default") if isinstance(item, dict) else "default"
+    
+    def dispatch(indexes: List[int], attempt: int) -> None:
+        groups: Dict[str, List[int]] = {}
+        for index in indexes:
+            groups.setdefault(node_router.candidates(thread_of(index))[0], []).append(index)
+        for node, group in groups.items():
+            tasks.append(asyncio.create_task(send_group(node, group, attempt)))
+    
+    async def send_group(node: str, indexes: List[int], attempt: int) -> None:
+        done = set()
+        error = f"El nodo {node} no devolvió el resultado"
+        try:
+            sub_batch = {**data, "items": [items[i] for i in indexes]}
+            async with client.stream("POST", f"{node}/chat/batch", json=sub_batch, headers=headers) as response:
+                if response.status_code != 200:
+                    error = f"El nodo {node} respondió {response.status_code}: {(await response.aread()).decode(errors='replace')}"
+                else:
+                    node_router.routed[node] += len(indexes)
+                    async for line in response.aiter_lines():
+                        if not line.strip():
+                            continue
+                        # Una línea inválida (truncada, sin `index`, repetida) se descarta;
+                        # sus mensajes reciben un error al final
+                        try:
+                            result = json.loads(line)
+                            index = indexes[result["index"]]
+                        except (ValueError, KeyError, IndexError, TypeError):
+                            error = f"El nodo {node} devolvió una línea inválida"
+                            continue
+                        if index in done:
+                            continue
+                        result["index"] = index
+                        done.add(index)
+                        await results.put(result)
+        except _NOT_DELIVERED:
+            node_router.mark_down(node)
+            if attempt < len(node_router.ring.nodes):
+                dispatch(indexes, attempt + 1)
+                return
+            error = "Ningún nodo disponible"
+        except httpx.HTTPError as e:
+            error = f"Error al comunicarse con el nodo {node}: {e}"
+        except Exception as e:
+            # Cualquier otro fallo tampoco puede dejar a merged() esperando
+            error = f"Error al procesar la respuesta del nodo {node}: {e}"
+        for index in indexes:
+            if index not in done:
+                await results.put({"index": index, "thread_id": thread_of(index), "error": error})
+    
+    async def merged():
+        dispatch(list(range(len(items))), 1)
+        try:
+            for _ in range(len(items)):
+                yield json.dumps(await results.get(), ensure_ascii=False) + "\n"
+        finally:
+            # Si el cliente se desconecta, cortar los sub-lotes en curso
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(merged(), media_type="application/x-ndjson")
+
+@app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"])
+async def proxy(request: Request):
+    """Reenvía la petición al nodo de su thread_id (o a cualquiera si no tiene)."""
+    body = await request.body()
+    return await _proxy(request, body, thread_id_for(request.url.path, body))
+
+async def _proxy(request: Request, body: bytes, thread_id: Optional[str]) -> StreamingResponse:
+    # Ruta sin decodificar, tal como la envió el cliente
+    target = (request.scope.get("raw_path") or request.url.path.encode("utf-8")).decode("latin-1")
+    if request.url.query:
+        target += "?" + request.url.query
+    
+    for node in node_router.candidates(thread_id):
+        upstream = client.build_request(request.method, node + target, headers=_forward_headers(request), content=body)
+        try:
+            response = await client.send(upstream, stream=True)
+        except _NOT_DELIVERED:
+            node_router.mark_down(node)
+            continue
+        except httpx.HTTPError as e:
+            raise HTTPException(status_code=502, detail=f"Error al comunicarse con el nodo {node}: {e}")
+        node_router.routed[node] += 1
+        headers = {key: value for key, value in response.headers.items() if key.lower() not in _HOP_BY_HOP}
+        headers[UPSTREAM_HEADER] = node
+        # La respuesta se transmite tal cual (SSE y NDJSON incluidos)
+        return StreamingResponse(
+            response.aiter_raw(),
+            status_code=response.status_code,
+            headers=headers,
+            background=BackgroundTask(response.aclose)
+        )
+    raise HTTPException(status_code=502, detail="Ningún nodo disponible")
+
+
+if __name__ == "__main__":
+    import uvicorn
+    port = int(os.environ.get("PORT", 8000))
+    uvicorn.run(app, host="0.0.0.0", port=port)
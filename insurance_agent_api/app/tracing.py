@@ -0,0 +1,178 @@
+"""
+Trazas distribuidas (OpenTelemetry) e ID de petición.
+
+Cada petición recibe un ID de correlación: el que envía el cliente en la
+cabecera X-Request-ID (Dash, Streamlit, Next.js) o uno nuevo. Se devuelve
+en la misma cabecera de la respuesta.
+
+Con TRACING_EXPORTER activado (requiere `pip install opentelemetry-sdk`)
+cada petición genera una traza con spans anidados:
+
+    POST /chat                      petición HTTP completa
+    └─ graph.run                    turno del grafo (incluye la espera por el lock del hilo)
+       ├─ checkpointer.get / put    lecturas y escrituras de checkpoints
+       └─ graph.node assistant      nodo del grafo
+          └─ llm.call               llamada real al modelo
+
+Sin TRACING_EXPORTER los spans no hacen nada y OpenTelemetry no se importa.
+"""
+
+import functools
+import re
+import uuid
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from config import TRACING_EXPORTER, TRACING_FILE_PATH
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+# Solo se aceptan IDs de cliente cortos y sin caracteres de control
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+_request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+_tracer = None
+_provider = None
+
+
+def setup_tracing() -> bool:
+    """
+    Configura el exportador indicado en TRACING_EXPORTER.
+    
+    - console: imprime cada span en la salida estándar
+    - file: un span por línea (JSON) en TRACING_FILE_PATH
+    - otlp: envía a un colector OpenTelemetry (OTEL_EXPORTER_OTLP_ENDPOINT);
+      requiere `pip install opentelemetry-exporter-otlp-proto-http`
+    
+    Returns:
+        True si las trazas quedan activas
+    """
+    global _tracer, _provider
+    if not TRACING_EXPORTER or TRACING_EXPORTER == "off":
+        return False
+    
+    from opentelemetry import trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    
+    if TRACING_EXPORTER == "console":
+        exporter = ConsoleSpanExporter()
+    elif TRACING_EXPORTER == "file":
+        exporter = ConsoleSpanExporter(
+            out=open(TRACING_FILE_PATH, "a", encoding="utf-8"),
+            formatter=lambda span: span.to_json(indent=None) + "\n"
+        )
+    elif TRACING_EXPORTER == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        exporter = OTLPSpanExporter()
+    else:
+        raise ValueError(f"TRACING_EXPORTER desconocido: {TRACING_EXPORTER!r} (usa 'console', 'file' u 'otlp')")
+    
+    # Los spans se exportan en lotes desde un hilo aparte, fuera del camino de cada petición
+    _provider = TracerProvider(resource=Resource.create({"service.name": "seguros-api"}))
+    _provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(_provider)
+    _tracer = trace.get_tracer("seguros-api")
+    return True
+
+
+def shutdown_tracing() -> None:
+    """Exporta los spans pendientes."""
+    if _provider is not None:
+        _provider.shutdown()
+
+
+def get_request_id() -> Optional[str]:
+    """ID de la petición en curso (None fuera de una petición)."""
+    return _request_id.get()
+
+
+def span(name: str, **attributes: Any) -> Any:
+    """
+    Context manager que abre un span hijo del span actual.
+    
+    Sin trazas activas no hace nada. Si el bloque lanza una excepción, el
+    span la registra y queda marcado como error.
+    """
+    if _tracer is None:
+        return nullcontext()
+    request_id = _request_id.get()
+    if request_id:
+        attributes["request.id"] = request_id
+    return _tracer.start_as_current_span(name, attributes=attributes)
+
+
+def traced(name: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Decorador que ejecuta una función asíncrona dentro de un span."""
+    def decorator(fn: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(fn)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(name):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class RequestContextMiddleware:
+    """
+    Middleware ASGI que asigna el ID de petición y abre el span raíz.
+    
+    El span dura hasta el último byte de la respuesta, así que en
+    /chat/stream y /chat/batch incluye todo el streaming. Si el cliente
+    envía `traceparent` (W3C), la traza continúa la del cliente.
+    """
+    
+    def __init__(self, app: Any):
+        self.app = app
+    
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        request_id = headers.get(REQUEST_ID_HEADER.lower(), "")
+        if not _VALID_REQUEST_ID.match(request_id):
+            request_id = uuid.uuid4().hex
+        token = _request_id.set(request_id)
+        status = {"code": 500}
+        
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (REQUEST_ID_HEADER.lower().encode("latin-1"), request_id.encode("latin-1"))
+                ]
+            await send(message)
+        
+        try:
+            with self._root_span(scope, headers, request_id) as root:
+                await self.app(scope, receive, send_wrapper)
+                if root is not None:
+                    route = getattr(scope.get("route"), "path", scope["path"])
+                    root.update_name(f"{scope['method']} {route}")
+                    root.set_attribute("http.route", route)
+                    root.set_attribute("http.status_code", status["code"])
+                    if status["code"] >= 500:
+                        from opentelemetry.trace import Status, StatusCode
+                        root.set_status(Status(StatusCode.ERROR))
+        finally:
+            _request_id.reset(token)
+    
+    @staticmethod
+    @contextmanager
+    def _root_span(scope: Dict[str, Any], headers: Dict[str, str], request_id: str) -> Iterator[Any]:
+        if _tracer is None:
+            yield None
+            return
+        from opentelemetry import propagate
+        from opentelemetry.trace import SpanKind
+        with _tracer.start_as_current_span(
+            f"{scope['method']} {scope['path']}",
+            context=propagate.extract(headers),
+            kind=SpanKind.SERVER,
+            attributes={"http.method": scope["method"], "http.target": scope["path"], "request.id": request_id}
+        ) as root:
+            yield root
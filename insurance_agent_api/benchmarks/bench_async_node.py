@@ -0,0 +1,71 @@
+"""
+Benchmark: nodo del asistente síncrono (llm.invoke) vs asíncrono (llm.ainvoke).
+
+Lanza N conversaciones concurrentes contra un modelo simulado con latencia
+fija y mide el throughput. Con el nodo síncrono LangGraph ejecuta cada
+llamada en el thread pool por defecto, por lo que el throughput se aplana
+al llegar al tamaño del pool; con el nodo asíncrono escala con la
+concurrencia.
+
+Uso:
+    python bench_async_node.py --latency 0.5 --concurrency 1 8 32 128
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import StateGraph, START, MessagesState
+
+from agent import InsuranceAgent
+from fake_llm import FakeChatModel
+
+
+def build_sync_agent(llm) -> InsuranceAgent:
+    """Agente con el nodo síncrono original, como referencia."""
+    agent = InsuranceAgent(llm=llm)
+
+    def assistant_node(state: MessagesState):
+        messages = [agent.system_message] + state["messages"]
+        return {"messages": [agent.llm.invoke(messages)]}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("assistant", assistant_node)
+    builder.add_edge(START, "assistant")
+    agent.graph = builder.compile(checkpointer=MemorySaver())
+    return agent
+
+
+async def run(agent: InsuranceAgent, concurrency: int) -> float:
+    """Ejecuta `concurrency` chats en paralelo y devuelve peticiones/segundo."""
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        agent.chat(f"¿Qué seguros ofrecen? ({i})", f"bench_{i}") for i in range(concurrency)
+    ))
+    return concurrency / (time.perf_counter() - start)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.5, help="Latencia simulada del modelo (s)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    args = parser.parse_args()
+
+    llm = FakeChatModel(latency_ms=args.latency * 1000)
+    agents = {"sync": build_sync_agent(llm), "async": InsuranceAgent(llm=llm)}
+
+    print(f"Latencia del modelo: {args.latency:.2f}s")
+    print(f"{'concurrencia':>12} {'sync req/s':>12} {'async req/s':>12} {'mejora':>8}")
+    for concurrency in args.concurrency:
+        sync_rps = await run(agents["sync"], concurrency)
+        async_rps = await run(agents["async"], concurrency)
+        print(f"{concurrency:>12} {sync_rps:>12.1f} {async_rps:>12.1f} {async_rps / sync_rps:>7.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,132 @@
+"""
+Benchmark: latencia de /history mientras /chat está saturado.
+
+Precarga conversaciones largas y mide la latencia de /history en reposo y
+mientras N clientes envían mensajes a /chat sin parar (modelo simulado),
+junto con la latencia de /chat durante la prueba. Compara:
+
+- original: lee el estado con get_state() y codifica la respuesta dentro
+  del event loop, sin caché.
+- sin caché: lectura con aget_state() y las respuestas de más de
+  HISTORY_OFFLOAD_MESSAGES mensajes codificadas en un hilo.
+- caché: configuración por defecto. Como "sin caché", pero las
+  conversaciones que no cambiaron desde la última lectura se sirven ya
+  codificadas (caché por versión de checkpoint).
+
+Uso:
+    python bench_history_under_load.py --messages 400 --chat-clients 64
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import httpx
+from langchain_core.messages import AIMessage, HumanMessage
+
+import main
+from agent import InsuranceAgent, _serialize_history
+from cache import ResponseCache
+from fake_llm import FakeChatModel
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def use_legacy_history(agent: InsuranceAgent) -> None:
+    """Sustituye la lectura de historial por la implementación original."""
+
+    async def legacy_page(thread_id, limit=None, before=None, since=None):
+        state = agent.graph.get_state({"configurable": {"thread_id": thread_id}})
+        messages = state.values.get("messages", [])
+        return {
+            "history": _serialize_history(messages),
+            "total": len(messages),
+            "start": 0,
+            "version": state.config["configurable"].get("checkpoint_id"),
+        }
+
+    agent.get_history_page = legacy_page
+    main.HISTORY_OFFLOAD_MESSAGES = float("inf")
+
+
+async def preload(agent: InsuranceAgent, threads: int, messages: int) -> None:
+    """Crea conversaciones largas sin pasar por el modelo."""
+    for t in range(threads):
+        history = []
+        for i in range(messages // 2):
+            history.append(HumanMessage(content=f"Pregunta {i} sobre el seguro de hogar y sus coberturas " * 3))
+            history.append(AIMessage(content=f"Respuesta {i}: el seguro de hogar cubre incendios, robos e inundaciones. " * 6))
+        await agent.graph.aupdate_state({"configurable": {"thread_id": f"largo_{t}"}}, {"messages": history}, as_node="assistant")
+
+
+async def measure_history(client: httpx.AsyncClient, threads: int, requests: int):
+    latencies = []
+    for i in range(requests):
+        start = time.perf_counter()
+        response = await client.get(f"/history/largo_{i % threads}")
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def saturate_chat(client: httpx.AsyncClient, client_id: int, stop: asyncio.Event, latencies: list):
+    turn = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.post("/chat", json={"message": f"Mensaje {turn} de {client_id}", "thread_id": f"carga_{client_id}"})
+        latencies.append(time.perf_counter() - start)
+        turn += 1
+
+
+async def run(variant: str, args) -> None:
+    main.HISTORY_OFFLOAD_MESSAGES = 64
+    main.history_cache = ResponseCache(128, ttl=0) if variant == "caché" else None
+    agent = InsuranceAgent(llm=FakeChatModel(latency_ms=args.latency * 1000))
+    if variant == "original":
+        use_legacy_history(agent)
+    main.agent = agent
+    await preload(agent, args.threads, args.messages)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        idle = await measure_history(client, args.threads, args.requests)
+
+        stop = asyncio.Event()
+        chat_latencies = []
+        load = [asyncio.create_task(saturate_chat(client, i, stop, chat_latencies)) for i in range(args.chat_clients)]
+        await asyncio.sleep(0.5)
+        chat_latencies.clear()
+        loaded = await measure_history(client, args.threads, args.requests)
+        stop.set()
+        await asyncio.gather(*load)
+
+    print(f"{variant:>11} {statistics.median(idle) * 1000:>10.1f} {percentile(idle, 99) * 1000:>10.1f} "
+          f"{statistics.median(loaded) * 1000:>10.1f} {percentile(loaded, 99) * 1000:>10.1f} "
+          f"{percentile(chat_latencies, 99) * 1000:>10.1f}")
+
+
+async def main_async():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=10, help="Conversaciones largas precargadas")
+    parser.add_argument("--messages", type=int, default=400, help="Mensajes por conversación larga")
+    parser.add_argument("--requests", type=int, default=100, help="Peticiones a /history por fase")
+    parser.add_argument("--chat-clients", type=int, default=64, help="Clientes enviando a /chat en paralelo")
+    parser.add_argument("--latency", type=float, default=0.2, help="Latencia del modelo simulado (s)")
+    args = parser.parse_args()
+
+    print(f"{'':>11} {'/history en reposo':>21} {'/history con carga':>21} {'/chat':>10}")
+    print(f"{'versión':>11} {'p50 ms':>10} {'p99 ms':>10} {'p50 ms':>10} {'p99 ms':>10} {'p99 ms':>10}")
+    for variant in ("original", "sin caché", "caché"):
+        await run(variant, args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main_async())
@@ -0,0 +1,113 @@
+"""
+Benchmark: micro-batching de llamadas al modelo (throughput vs latencia).
+
+Usa un modelo simulado con cuota de peticiones simultáneas y un endpoint
+batch (ver BatchStubChatModel). Sin micro-batching cada conversación ocupa
+una petición de la cuota; con micro-batching las llamadas que llegan en la
+misma ventana comparten una. Para cada ventana se lanzan N conversaciones
+concurrentes (mensajes distintos, para que no actúe single-flight) y se
+mide throughput y latencia p50/p99 por conversación.
+
+Con --check-streams, en lugar de medir, comprueba que con micro-batching
+cada respuesta en streaming solo contiene su propia respuesta (el lote no
+debe ejecutarse con los callbacks de la primera petición); termina con
+código 1 si algún stream recibe texto de otra conversación.
+
+Uso:
+    python bench_micro_batching.py --concurrency 64 --windows 0 5 20 50
+    python bench_micro_batching.py --check-streams
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from agent import InsuranceAgent
+from concurrency import MicroBatcher
+from fake_llm import DEFAULT_CANNED_ANSWERS, FakeChatModel
+from stub_model import BatchStubChatModel
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def run(window_ms: float, args) -> None:
+    llm = BatchStubChatModel(latency_ms=args.latency * 1000, max_parallel_requests=args.parallel)
+    agent = InsuranceAgent(llm=llm)
+    if window_ms > 0:
+        agent.micro_batcher = MicroBatcher(
+            lambda batch: llm.abatch(batch, return_exceptions=True),
+            window=window_ms / 1000,
+            max_size=args.max_batch
+        )
+
+    latencies = []
+
+    async def one(i: int):
+        start = time.perf_counter()
+        await agent.chat(f"Pregunta {i}", f"bench_{window_ms}_{i}")
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    batch_size = agent.micro_batcher.stats()["avg_batch_size"] if agent.micro_batcher else 1
+    print(f"{window_ms:>10.0f} {args.concurrency / elapsed:>10.1f} "
+          f"{statistics.median(latencies) * 1000:>10.0f} {percentile(latencies, 99) * 1000:>10.0f} {batch_size:>10}")
+
+
+async def check_streams(args) -> bool:
+    llm = FakeChatModel(latency_ms=100, token_delay_ms=5)
+    agent = InsuranceAgent(llm=llm)
+    agent.micro_batcher = MicroBatcher(
+        lambda batch: llm.abatch(batch, return_exceptions=True),
+        window=max(args.windows) / 1000 or 0.03,
+        max_size=args.max_batch
+    )
+    products = ["auto", "vida", "hogar", "salud", "viaje"]
+
+    async def one(i: int) -> str:
+        tokens = [token async for token in agent.chat_stream(f"Seguro de {products[i]}", f"stream_{i}")]
+        return "".join(tokens)
+
+    texts = await asyncio.gather(*(one(i) for i in range(len(products))))
+    ok = True
+    for product, text in zip(products, texts):
+        expected = DEFAULT_CANNED_ANSWERS[product]
+        if text != expected:
+            ok = False
+            print(f"❌ stream de {product!r} recibió: {text!r}")
+    print(f"Lotes: {agent.micro_batcher.stats()}")
+    if ok:
+        print(f"✅ {len(products)} streams concurrentes, cada uno con su propia respuesta")
+    return ok
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=64, help="Conversaciones concurrentes")
+    parser.add_argument("--windows", type=float, nargs="+", default=[0, 5, 20, 50], help="Ventanas en ms (0 = sin micro-batching)")
+    parser.add_argument("--max-batch", type=int, default=16, help="Tamaño máximo de lote")
+    parser.add_argument("--latency", type=float, default=0.3, help="Latencia por petición del modelo (s)")
+    parser.add_argument("--parallel", type=int, default=4, help="Peticiones simultáneas permitidas por el proveedor")
+    parser.add_argument("--check-streams", action="store_true", help="Comprobar que los streams de un mismo lote no se mezclan")
+    args = parser.parse_args()
+
+    if args.check_streams:
+        sys.exit(0 if await check_streams(args) else 1)
+
+    print(f"{'ventana ms':>10} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'lote medio':>10}")
+    for window_ms in args.windows:
+        await run(window_ms, args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
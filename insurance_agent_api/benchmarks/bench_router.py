@@ -0,0 +1,187 @@
+"""
+Router con hashing consistente: reparto de carga y conversaciones movidas.
+
+Sin argumentos es un cálculo sin red: reparte muchos thread_id en un anillo
+de N nodos y mide qué fracción de conversaciones cambia de nodo al añadir o
+quitar uno (lo ideal es ~1/N), comparado con el reparto ingenuo
+`hash % N`, y cuánto se desvía de la media el nodo más cargado según los
+nodos virtuales.
+
+Con --live levanta N nodos de la API (modelo simulado, checkpointer en
+memoria) en puertos distintos y el router delante, conversa a través del
+router y comprueba que cada conversación queda siempre en el mismo nodo
+(cabecera X-Upstream-Node) con su historial completo. Después detiene un
+nodo: solo las conversaciones de ese nodo deben cambiar de nodo.
+
+Uso:
+    python bench_router.py --nodes 3 --threads 100000
+    python bench_router.py --live --nodes 3 --threads 200 --turns 3
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import socket
+import subprocess
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import httpx
+
+from router import UPSTREAM_HEADER, HashRing
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+
+
+def moved_fraction(before: dict, after: dict) -> float:
+    return sum(1 for key in before if before[key] != after[key]) / len(before)
+
+
+def modulo_owner(key: str, nodes: list) -> str:
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return nodes[int.from_bytes(digest, "big") % len(nodes)]
+
+
+def offline(args) -> None:
+    keys = [f"thread_{i}" for i in range(args.threads)]
+    nodes = [f"http://node-{i}:8000" for i in range(args.nodes)]
+    extra = f"http://node-{args.nodes}:8000"
+
+    print(f"📊 {args.threads} conversaciones, {args.nodes} nodos")
+    print(f"\n{'nodos virtuales':>16} {'máx/media':>10} {'mín/media':>10}")
+    for virtual_nodes in args.virtual_nodes:
+        ring = HashRing(nodes, virtual_nodes)
+        load = {node: 0 for node in nodes}
+        for key in keys:
+            load[ring.node_for(key)] += 1
+        mean = args.threads / args.nodes
+        print(f"{virtual_nodes:>16} {max(load.values()) / mean:>10.3f} {min(load.values()) / mean:>10.3f}")
+
+    ring = HashRing(nodes, args.virtual_nodes[-1])
+    before = {key: ring.node_for(key) for key in keys}
+    ring.add(extra)
+    added = {key: ring.node_for(key) for key in keys}
+    ring.remove(extra)
+    ring.remove(nodes[0])
+    removed = {key: ring.node_for(key) for key in keys}
+
+    modulo_before = {key: modulo_owner(key, nodes) for key in keys}
+    modulo_added = {key: modulo_owner(key, nodes + [extra]) for key in keys}
+    modulo_removed = {key: modulo_owner(key, nodes[1:]) for key in keys}
+
+    print(f"\n{'cambio':>18} {'ideal':>8} {'anillo':>8} {'hash % N':>9}")
+    print(f"{'+1 nodo':>18} {1 / (args.nodes + 1):>8.1%} {moved_fraction(before, added):>8.1%} "
+          f"{moved_fraction(modulo_before, modulo_added):>9.1%}")
+    print(f"{'-1 nodo':>18} {1 / args.nodes:>8.1%} {moved_fraction(before, removed):>8.1%} "
+          f"{moved_fraction(modulo_before, modulo_removed):>9.1%}")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start(script: str, port: int, **env) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, script], cwd=APP_DIR, env=dict(os.environ, PORT=str(port), **env),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+async def wait_ready(url: str, path: str = "/health", timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=url, timeout=5) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(path)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} no arrancó a tiempo")
+
+
+async def converse(client: httpx.AsyncClient, threads: list, turns: int, concurrency: int) -> dict:
+    """Conversa por el router; devuelve {thread_id: set de nodos que lo atendieron}."""
+    seen = {thread_id: set() for thread_id in threads}
+    pending = iter(threads)
+
+    async def worker():
+        for thread_id in pending:
+            for turn in range(turns):
+                response = await client.post("/chat", json={"message": f"Hola, pregunta {turn}", "thread_id": thread_id})
+                response.raise_for_status()
+                seen[thread_id].add(response.headers[UPSTREAM_HEADER])
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return seen
+
+
+async def history_complete(client: httpx.AsyncClient, threads: list, messages: int) -> int:
+    """Conversaciones cuyo historial (leído por el router) tiene `messages` mensajes."""
+    totals = await asyncio.gather(*(client.get(f"/history/{thread_id}") for thread_id in threads))
+    return sum(1 for response in totals if response.json()["total"] == messages)
+
+
+async def live(args) -> None:
+    ports = [free_port() for _ in range(args.nodes)]
+    nodes = [f"http://127.0.0.1:{port}" for port in ports]
+    router_port = free_port()
+    processes = [start("main.py", port, LLM_BACKEND="fake", FAKE_LLM_LATENCY_MS="10", CHECKPOINTER_BACKEND="memory")
+                 for port in ports]
+    try:
+        await asyncio.gather(*(wait_ready(node) for node in nodes))
+        processes.append(start("router.py", router_port, ROUTER_NODES=",".join(nodes), ROUTER_NODE_COOLDOWN_SECONDS="60"))
+        await wait_ready(f"http://127.0.0.1:{router_port}", "/router/health")
+
+        threads = [f"router_{uuid.uuid4().hex[:10]}" for _ in range(args.threads)]
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{router_port}", timeout=60) as client:
+            seen = await converse(client, threads, args.turns, args.concurrency)
+            owner = {thread_id: next(iter(nodes_seen)) for thread_id, nodes_seen in seen.items()}
+            sticky = sum(1 for nodes_seen in seen.values() if len(nodes_seen) == 1)
+            complete = await history_complete(client, threads, 2 * args.turns)
+            print(f"📡 {args.threads} conversaciones x {args.turns} turnos por el router ({args.nodes} nodos)")
+            for node in nodes:
+                print(f"   {node}: {sum(1 for n in owner.values() if n == node)} conversaciones")
+            print(f"   Siempre en el mismo nodo: {sticky}/{args.threads}")
+            print(f"   Historial completo:       {complete}/{args.threads}")
+
+            # Se detiene el primer nodo: sus conversaciones pasan al siguiente del anillo
+            processes[0].terminate()
+            processes[0].wait(timeout=30)
+            after = await converse(client, threads, 1, args.concurrency)
+            moved = [t for t in threads if after[t] != {owner[t]}]
+            expected = [t for t in threads if owner[t] == nodes[0]]
+            print(f"\n🛑 Nodo {nodes[0]} detenido")
+            print(f"   Conversaciones que cambiaron de nodo: {len(moved)} ({len(moved) / args.threads:.1%})")
+            print(f"   Todas eran del nodo detenido: {'sí' if set(moved) == set(expected) else 'NO'}")
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+                process.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=3, help="Número de nodos")
+    parser.add_argument("--threads", type=int, default=100000, help="Conversaciones (con --live, usa unas cientos)")
+    parser.add_argument("--virtual-nodes", type=int, nargs="+", default=[1, 10, 40, 160], help="Nodos virtuales por nodo a comparar")
+    parser.add_argument("--live", action="store_true", help="Levantar nodos y router reales en puertos locales")
+    parser.add_argument("--turns", type=int, default=3, help="Turnos por conversación (con --live)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Clientes en paralelo (con --live)")
+    args = parser.parse_args()
+
+    if args.live:
+        asyncio.run(live(args))
+    else:
+        offline(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Benchmark: throughput de /chat con 1..N workers compartiendo SQLite.
+
+Para cada número de workers arranca `python main.py` con WORKERS=n,
+CHECKPOINTER_BACKEND=sqlite (base temporal) y el modelo simulado, envía
+conversaciones de varios turnos durante unos segundos con muchos clientes
+en paralelo y mide throughput y latencia. Después comprueba que los locks
+entre procesos funcionan: muchos mensajes simultáneos al mismo thread_id,
+repartidos entre workers, deben quedar todos en el historial.
+
+El throughput solo escala mientras haya núcleos libres: con N workers en
+una máquina de un núcleo no se gana nada.
+
+Uso:
+    python bench_workers.py --workers 1 2 4 --clients 64 --duration 15
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_ready(client: httpx.AsyncClient, process: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("El servidor terminó antes de estar listo")
+        try:
+            if (await client.get("/health")).json().get("agent_ready"):
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("El servidor no arrancó a tiempo")
+
+
+async def load(client: httpx.AsyncClient, args) -> tuple:
+    """Clientes en bucle cerrado: cada uno conversa `turns` turnos por hilo."""
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + args.duration
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            thread_id = f"bench_{uuid.uuid4().hex[:12]}"
+            for turn in range(args.turns):
+                start = time.perf_counter()
+                response = await client.post("/chat", json={"message": f"¿Cuánto cuesta el seguro de auto? ({turn})", "thread_id": thread_id})
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.clients)))
+    return latencies, errors, time.perf_counter() - start
+
+
+async def same_thread_check(client: httpx.AsyncClient, messages: int) -> bool:
+    """Mensajes simultáneos al mismo hilo: ninguno debe perderse entre workers."""
+    thread_id = f"caliente_{uuid.uuid4().hex[:8]}"
+    responses = await asyncio.gather(*(
+        client.post("/chat", json={"message": f"Mensaje {i}", "thread_id": thread_id}) for i in range(messages)
+    ))
+    if any(r.status_code != 200 for r in responses):
+        return False
+    history = (await client.get(f"/history/{thread_id}")).json()
+    return history["total"] == 2 * messages
+
+
+async def run(workers: int, args) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        port = free_port()
+        env = dict(
+            os.environ,
+            WORKERS=str(workers),
+            PORT=str(port),
+            LLM_BACKEND="fake",
+            FAKE_LLM_LATENCY_MS=str(args.latency * 1000),
+            CHECKPOINTER_BACKEND="sqlite",
+            SQLITE_CHECKPOINT_PATH=os.path.join(tmp, "checkpoints.sqlite"),
+            MAX_CONCURRENT_CHATS="0",
+        )
+        process = subprocess.Popen(
+            [sys.executable, "main.py"], cwd=APP_DIR, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            limits = httpx.Limits(max_connections=args.clients + 50)
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60, limits=limits) as client:
+                await wait_ready(client, process)
+                latencies, errors, elapsed = await load(client, args)
+                consistent = await same_thread_check(client, args.same_thread_messages)
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+    print(f"{workers:>8} {len(latencies) / elapsed:>10.1f} {statistics.median(latencies) * 1000:>10.1f} "
+          f"{percentile(latencies, 99) * 1000:>10.1f} {errors:>8} {'sí' if consistent else 'NO':>12}")
+
+
+async def main_async():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Números de workers a probar")
+    parser.add_argument("--clients", type=int, default=64, help="Clientes en paralelo")
+    parser.add_argument("--turns", type=int, default=3, help="Turnos por conversación")
+    parser.add_argument("--duration", type=float, default=15, help="Segundos de carga por configuración")
+    parser.add_argument("--latency", type=float, default=0.05, help="Latencia del modelo simulado (s)")
+    parser.add_argument("--same-thread-messages", type=int, default=40, help="Mensajes simultáneos al mismo hilo")
+    args = parser.parse_args()
+
+    print(f"CPUs disponibles: {os.cpu_count()}")
+    print(f"{'workers':>8} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'errores':>8} {'sin pérdidas':>12}")
+    for workers in args.workers:
+        await run(workers, args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main_async())
@@ -0,0 +1,99 @@
+"""
+Comprobación: /chat/stream libera su hueco de admisión aunque el cliente se
+desconecte antes de recibir la respuesta.
+
+Con MAX_CONCURRENT_CHATS=1 envía varias peticiones a /chat/stream cuyo
+cliente "se desconecta" al empezar la respuesta (send falla en
+http.response.start, como cuando el socket ya está cerrado) y después una
+petición normal a /chat. Si algún hueco queda ocupado, /health muestra
+`in_flight` > 0 y /chat responde 429 para siempre.
+
+Usa el modelo simulado (sin red ni API key). Termina con código 1 si el
+hueco no se libera.
+
+Uso:
+    python check_stream_disconnect.py
+    python check_stream_disconnect.py --disconnects 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+os.environ["LLM_BACKEND"] = "fake"
+os.environ["MAX_CONCURRENT_CHATS"] = "1"
+os.environ.setdefault("FAKE_LLM_LATENCY_MS", "50")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import httpx
+
+import main
+
+
+def http_scope(path: str, body: bytes) -> dict:
+    return {
+        "type": "http",
+        "http_version": "1.1",
+        "method": "POST",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "scheme": "http",
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8000),
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    }
+
+
+async def disconnected_stream(i: int) -> None:
+    """Petición a /chat/stream cuyo cliente ya no está al empezar la respuesta."""
+    body = json.dumps({"message": "¿Qué cubre el seguro de hogar?", "thread_id": f"disconnect_{i}"}).encode()
+    delivered = False
+
+    async def receive():
+        nonlocal delivered
+        if not delivered:
+            delivered = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            raise OSError("cliente desconectado")
+
+    try:
+        await main.app(http_scope("/chat/stream", body), receive, send)
+    except OSError:
+        pass
+
+
+async def run(args) -> bool:
+    async with main.lifespan(main.app):
+        for i in range(args.disconnects):
+            await disconnected_stream(i)
+        # El grafo de cada stream sigue en segundo plano; da tiempo a que termine
+        await asyncio.sleep(0.5)
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+            in_flight = (await client.get("/health")).json()["admission"]["in_flight"]
+            response = await client.post("/chat", json={"message": "Hola", "thread_id": "after_disconnect"})
+
+    print(f"Desconexiones: {args.disconnects}, in_flight después: {in_flight}, /chat: {response.status_code}")
+    ok = in_flight == 0 and response.status_code == 200
+    print("✅ Los huecos de admisión se liberan" if ok else "❌ Quedaron huecos de admisión ocupados")
+    return ok
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--disconnects", type=int, default=5, help="Streams desconectados antes de la petición normal")
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(run(args)) else 1)
+
+
+if __name__ == "__main__":
+    main_cli()
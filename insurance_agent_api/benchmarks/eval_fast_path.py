@@ -0,0 +1,146 @@
+"""
+Evaluación de la ruta rápida (FAST_PATH_ENABLED y CATALOG_LOOKUP_ENABLED)
+sobre un conjunto etiquetado.
+
+Decide cada mensaje de fast_path_samples.jsonl ({"text", "label"} con label
+greeting, off_topic, catalog o llm) y reporta precisión y cobertura
+(recall) por clase, los errores y la latencia de decisión. Las muestras
+catalog llevan además "expect", un texto que la respuesta debe contener
+(por ejemplo el precio): una respuesta del catálogo sin él cuenta como
+falso positivo.
+
+La métrica que importa es la precisión: un falso positivo es una pregunta
+que recibe un saludo, una negativa o un dato equivocado. Un falso negativo
+solo cuesta una llamada al modelo. Termina con código 1 si la precisión o
+la latencia p99 no cumplen el presupuesto.
+
+Uso:
+    python eval_fast_path.py
+    python eval_fast_path.py --no-catalog
+    python eval_fast_path.py --samples mis_muestras.jsonl --min-precision 0.99 --json fast_path.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from catalog import CatalogIndex
+from fast_path import CATALOG, GREETING, OFF_TOPIC, FastPath
+
+LABELS = (GREETING, OFF_TOPIC, CATALOG)
+DEFAULT_SAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fast_path_samples.jsonl")
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def load_samples(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(samples: list, fast_path: FastPath, repeats: int) -> dict:
+    expected = []
+    predictions = []
+    for sample in samples:
+        label = sample["label"]
+        if label == CATALOG and fast_path.catalog is None:
+            label = "llm"
+        predicted, response = fast_path.answer(sample["text"])
+        # Una respuesta del catálogo sin el dato esperado es un error, no un acierto
+        if predicted == CATALOG and label == CATALOG and sample.get("expect", "") not in response:
+            predicted = "catalog (dato incorrecto)"
+        expected.append(label)
+        predictions.append(predicted)
+
+    classes = {}
+    for label in LABELS:
+        tp = sum(1 for e, p in zip(expected, predictions) if p == label and e == label)
+        fp = sum(1 for e, p in zip(expected, predictions) if p.startswith(label) and p != e)
+        fn = sum(1 for e, p in zip(expected, predictions) if p != label and e == label)
+        classes[label] = {
+            "precision": tp / (tp + fp) if tp + fp else None,
+            "recall": tp / (tp + fn) if tp + fn else None,
+            "support": tp + fn,
+        }
+
+    # Latencia por decisión, repitiendo todo el conjunto para tener muestras estables
+    latencies = []
+    for _ in range(repeats):
+        for sample in samples:
+            start = time.perf_counter_ns()
+            fast_path.answer(sample["text"])
+            latencies.append((time.perf_counter_ns() - start) / 1000)
+
+    fast = sum(1 for p in predictions if p != "llm")
+    return {
+        "samples": len(samples),
+        "classes": classes,
+        "answered_without_llm": fast / len(samples),
+        "latency_us": {
+            "p50": percentile(latencies, 50),
+            "p99": percentile(latencies, 99),
+            "max": max(latencies),
+        },
+        "errors": [
+            {"text": s["text"], "label": e, "predicted": p}
+            for s, e, p in zip(samples, expected, predictions) if p != e
+        ],
+    }
+
+
+def report(result: dict, args) -> bool:
+    print(f"📊 {result['samples']} muestras, {result['answered_without_llm']:.0%} respondidas sin el modelo\n")
+    print(f"{'clase':>10} {'precisión':>10} {'recall':>8} {'muestras':>9}")
+    for label, scores in result["classes"].items():
+        precision = f"{scores['precision']:.3f}" if scores["precision"] is not None else "-"
+        recall = f"{scores['recall']:.3f}" if scores["recall"] is not None else "-"
+        print(f"{label:>10} {precision:>10} {recall:>8} {scores['support']:>9}")
+    latency = result["latency_us"]
+    print(f"\nLatencia de decisión: p50 {latency['p50']:.1f} µs, p99 {latency['p99']:.1f} µs, máx {latency['max']:.1f} µs")
+
+    if result["errors"]:
+        print("\nErrores:")
+        for error in result["errors"]:
+            print(f"   [{error['label']} -> {error['predicted']}] {error['text']}")
+
+    failures = []
+    for label, scores in result["classes"].items():
+        if scores["precision"] is not None and scores["precision"] < args.min_precision:
+            failures.append(f"precisión de {label} {scores['precision']:.3f} < {args.min_precision}")
+    if latency["p99"] > args.max_p99_us:
+        failures.append(f"latencia p99 {latency['p99']:.1f} µs > {args.max_p99_us} µs")
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("\n✅ Precisión y latencia dentro del presupuesto")
+    return not failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", default=DEFAULT_SAMPLES, help="Archivo JSONL con muestras etiquetadas")
+    parser.add_argument("--repeats", type=int, default=200, help="Repeticiones del conjunto para medir latencia")
+    parser.add_argument("--no-catalog", action="store_true", help="Evaluar sin el índice del catálogo (solo FAST_PATH_ENABLED)")
+    parser.add_argument("--min-precision", type=float, default=0.98, help="Precisión mínima de cada clase respondida sin el modelo")
+    parser.add_argument("--max-p99-us", type=float, default=1000, help="Latencia p99 máxima por decisión (µs)")
+    parser.add_argument("--json", help="Guardar el resultado en este archivo JSON")
+    args = parser.parse_args()
+
+    fast_path = FastPath(catalog=None if args.no_catalog else CatalogIndex())
+    result = evaluate(load_samples(args.samples), fast_path, args.repeats)
+    ok = report(result, args)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
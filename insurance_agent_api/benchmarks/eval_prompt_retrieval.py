@@ -0,0 +1,232 @@
+"""
+Evaluación del prompt por recuperación (PROMPT_RETRIEVAL_TOP_K).
+
+Cada muestra de prompt_retrieval_samples.jsonl tiene la pregunta del
+cliente ("question"), los turnos anteriores opcionales ("history", pares
+[rol, texto]), las secciones del catálogo que la respuesta necesita
+("sections") y opcionalmente "expect", un dato que la respuesta debe
+contener (por ejemplo el precio).
+
+Sin red, para cada top_k reporta:
+
+- recall de secciones: fracción de secciones necesarias que llegan al
+  prompt (el prompt completo de respaldo las incluye todas)
+- tamaño medio del prompt del sistema en caracteres y tokens estimados
+  (caracteres / 4) frente al prompt completo
+- latencia de armado del prompt por turno
+
+Con --llm además envía cada muestra al modelo de LLM_BACKEND con el prompt
+completo y con el recuperado, y compara tokens de entrada (usage_metadata),
+latencia y paridad de la respuesta: el dato esperado debe aparecer en ambas
+y la similitud entre las dos respuestas (cache.cosine) se reporta como
+referencia. Con Gemini requiere GOOGLE_API_KEY.
+
+Termina con código 1 si el recall de secciones queda por debajo del mínimo.
+
+Uso:
+    python eval_prompt_retrieval.py
+    python eval_prompt_retrieval.py --top-k 1 2 3 --json retrieval.json
+    LLM_BACKEND=gemini python eval_prompt_retrieval.py --top-k 2 --llm
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from agent import InsuranceAgent
+from cache import cosine, message_text, vectorize
+from catalog import catalog_sections
+from retrieval import PromptAssembler
+
+DEFAULT_SAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompt_retrieval_samples.jsonl")
+ALL_SECTIONS = frozenset(section["id"] for section in catalog_sections())
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def load_samples(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def conversation(sample: dict) -> list:
+    """Mensajes de la muestra: historial más la pregunta actual."""
+    messages = [
+        HumanMessage(content=text) if role == "human" else AIMessage(content=text)
+        for role, text in sample.get("history", [])
+    ]
+    return messages + [HumanMessage(content=sample["question"])]
+
+
+def estimate_tokens(chars: float) -> float:
+    # Aproximación habitual para texto en español; el valor real lo da --llm
+    return chars / 4
+
+
+def evaluate(samples: list, top_k: int, repeats: int) -> dict:
+    assembler = PromptAssembler(top_k)
+    needed = 0
+    found = 0
+    complete = 0
+    misses = []
+    for sample in samples:
+        selected = assembler.select(conversation(sample))
+        included = ALL_SECTIONS if selected is None else set(selected)
+        expected = set(sample["sections"])
+        needed += len(expected)
+        found += len(expected & included)
+        if expected <= included:
+            complete += 1
+        else:
+            misses.append({
+                "question": sample["question"],
+                "missing": sorted(expected - included),
+                "selected": sorted(included),
+            })
+
+    # Latencia de armado, repitiendo el conjunto; los prompts ya están en caché
+    latencies = []
+    for _ in range(repeats):
+        for sample in samples:
+            messages = conversation(sample)
+            start = time.perf_counter_ns()
+            assembler.system_prompt(messages)
+            latencies.append((time.perf_counter_ns() - start) / 1000)
+
+    stats = assembler.stats()
+    return {
+        "top_k": top_k,
+        "samples": len(samples),
+        "section_recall": found / needed,
+        "complete_ratio": complete / len(samples),
+        "full_prompt_fallbacks": stats["full_prompt_fallbacks"] // repeats if repeats else 0,
+        "avg_prompt_chars": stats["avg_prompt_chars"],
+        "full_prompt_chars": stats["full_prompt_chars"],
+        "reduction": 1 - stats["avg_prompt_chars"] / stats["full_prompt_chars"] if stats["avg_prompt_chars"] else None,
+        "latency_us": {"p50": percentile(latencies, 50), "p99": percentile(latencies, 99)},
+        "misses": misses,
+    }
+
+
+async def compare_answers(samples: list, top_k: int) -> dict:
+    """Respuestas del modelo con el prompt completo y con el recuperado."""
+    llm = InsuranceAgent._create_llm(None)
+    assembler = PromptAssembler(top_k)
+    rows = []
+    for sample in samples:
+        messages = conversation(sample)
+        row = {"question": sample["question"]}
+        for variant, prompt in (("full", assembler.full_prompt), ("retrieved", assembler.system_prompt(messages))):
+            start = time.perf_counter()
+            response = await llm.ainvoke([SystemMessage(content=prompt)] + messages)
+            usage = getattr(response, "usage_metadata", None) or {}
+            row[variant] = {
+                "text": message_text(response),
+                "input_tokens": usage.get("input_tokens"),
+                "seconds": time.perf_counter() - start,
+            }
+        expect = sample.get("expect")
+        row["expect"] = expect
+        row["full_has_fact"] = expect is None or expect in row["full"]["text"]
+        row["retrieved_has_fact"] = expect is None or expect in row["retrieved"]["text"]
+        row["similarity"] = cosine(vectorize(row["full"]["text"]), vectorize(row["retrieved"]["text"]))
+        rows.append(row)
+
+    def mean(values):
+        values = [v for v in values if v is not None]
+        return sum(values) / len(values) if values else None
+
+    # Paridad: el dato esperado aparece con el prompt recuperado siempre que aparece con el completo
+    with_fact = [row for row in rows if row["full_has_fact"]]
+    return {
+        "top_k": top_k,
+        "input_tokens": {
+            "full": mean(row["full"]["input_tokens"] for row in rows),
+            "retrieved": mean(row["retrieved"]["input_tokens"] for row in rows),
+        },
+        "latency_s": {
+            "full": percentile([row["full"]["seconds"] for row in rows], 50),
+            "retrieved": percentile([row["retrieved"]["seconds"] for row in rows], 50),
+        },
+        "fact_parity": sum(1 for row in with_fact if row["retrieved_has_fact"]) / len(with_fact) if with_fact else None,
+        "similarity": mean(row["similarity"] for row in rows),
+        "mismatches": [
+            {"question": row["question"], "expect": row["expect"], "retrieved": row["retrieved"]["text"]}
+            for row in with_fact if not row["retrieved_has_fact"]
+        ],
+    }
+
+
+def report(results: list, args) -> bool:
+    full = results[0]["full_prompt_chars"]
+    print(f"📊 {results[0]['samples']} muestras, prompt completo {full} caracteres (~{estimate_tokens(full):.0f} tokens)\n")
+    print(f"{'top_k':>5} {'recall':>7} {'completas':>10} {'respaldo':>9} {'caracteres':>11} {'~tokens':>8} {'reducción':>10} {'p50 µs':>7} {'p99 µs':>7}")
+    for result in results:
+        print(
+            f"{result['top_k']:>5} {result['section_recall']:>7.3f} {result['complete_ratio']:>10.0%} "
+            f"{result['full_prompt_fallbacks']:>9} {result['avg_prompt_chars']:>11} "
+            f"{estimate_tokens(result['avg_prompt_chars']):>8.0f} {result['reduction']:>10.0%} "
+            f"{result['latency_us']['p50']:>7.1f} {result['latency_us']['p99']:>7.1f}"
+        )
+
+    failures = []
+    for result in results:
+        if result["misses"]:
+            print(f"\nSecciones que faltan con top_k={result['top_k']}:")
+            for miss in result["misses"]:
+                print(f"   falta {', '.join(miss['missing'])} (elegidas: {', '.join(miss['selected'])}) {miss['question']}")
+        if result["section_recall"] < args.min_recall:
+            failures.append(f"recall de secciones con top_k={result['top_k']} {result['section_recall']:.3f} < {args.min_recall}")
+
+    for comparison in args.comparisons:
+        tokens = comparison["input_tokens"]
+        latency = comparison["latency_s"]
+        print(f"\n🤖 Modelo con top_k={comparison['top_k']} (completo -> recuperado):")
+        if tokens["full"] is not None:
+            print(f"   Tokens de entrada: {tokens['full']:.0f} -> {tokens['retrieved']:.0f}")
+        print(f"   Latencia p50: {latency['full']:.2f} s -> {latency['retrieved']:.2f} s")
+        if comparison["fact_parity"] is not None:
+            print(f"   Paridad del dato esperado: {comparison['fact_parity']:.0%}")
+        print(f"   Similitud media entre respuestas: {comparison['similarity']:.2f}")
+        for mismatch in comparison["mismatches"]:
+            print(f"   ⚠️ sin {mismatch['expect']!r}: {mismatch['question']}")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("\n✅ Recall de secciones dentro del presupuesto")
+    return not failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", default=DEFAULT_SAMPLES, help="Archivo JSONL con muestras etiquetadas")
+    parser.add_argument("--top-k", type=int, nargs="+", default=[2, 3], help="Valores de PROMPT_RETRIEVAL_TOP_K a comparar")
+    parser.add_argument("--repeats", type=int, default=200, help="Repeticiones del conjunto para medir latencia")
+    parser.add_argument("--min-recall", type=float, default=0.95, help="Recall mínimo de secciones para cada top_k")
+    parser.add_argument("--llm", action="store_true", help="Comparar respuestas del modelo (LLM_BACKEND) con ambos prompts")
+    parser.add_argument("--json", help="Guardar el resultado en este archivo JSON")
+    args = parser.parse_args()
+
+    samples = load_samples(args.samples)
+    results = [evaluate(samples, top_k, args.repeats) for top_k in args.top_k]
+    args.comparisons = [asyncio.run(compare_answers(samples, top_k)) for top_k in args.top_k] if args.llm else []
+    ok = report(results, args)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"retrieval": results, "llm": args.comparisons}, f, ensure_ascii=False, indent=2)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
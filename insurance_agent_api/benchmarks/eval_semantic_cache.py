@@ -0,0 +1,128 @@
+"""
+Evaluación de la caché semántica (SEMANTIC_CACHE_*) sobre pares etiquetados.
+
+Cada línea de semantic_cache_samples.jsonl es un par {"cached", "question",
+"same"}: una pregunta ya guardada en la caché, una pregunta nueva y si la
+respuesta guardada sirve para la nueva (paráfrasis) o no (otro producto,
+otro país, otra condición...). Para cada par se guarda `cached` en una
+caché vacía y se busca `question`.
+
+Para varios umbrales reporta precisión y recall de los aciertos con las
+reglas de la caché (sinónimos del catálogo y mismas palabras de producto y
+condición) y, como referencia, con la similitud de n-gramas sola. La
+métrica que importa es la precisión: un falso acierto sirve la respuesta
+de otra pregunta, mientras que un fallo solo cuesta una llamada al modelo.
+Termina con código 1 si la precisión con --threshold (por defecto
+SEMANTIC_CACHE_THRESHOLD) baja de --min-precision.
+
+Uso:
+    python eval_semantic_cache.py
+    python eval_semantic_cache.py --threshold 0.8 --json semantic.json
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from cache import SemanticCache, cosine, vectorize
+from catalog import INTENTS, synonym_map
+from config import SEMANTIC_CACHE_THRESHOLD
+
+DEFAULT_SAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "semantic_cache_samples.jsonl")
+THRESHOLDS = (0.5, 0.6, 0.7, 0.8, 0.85, 0.88, 0.9, 0.95)
+
+
+def load_samples(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def scores(samples: list, threshold: float) -> dict:
+    """Precisión y recall de los aciertos de la caché y de los n-gramas solos."""
+    result = {}
+    for variant in ("cache", "ngrams"):
+        tp = fp = fn = 0
+        errors = []
+        for sample in samples:
+            if variant == "cache":
+                cache = SemanticCache(1, threshold, synonyms=synonym_map(), intents=INTENTS)
+                cache.add(sample["cached"], "respuesta")
+                hit = cache.lookup(sample["question"])[0] is not None
+                score = cache.similarity(sample["cached"], sample["question"])
+            else:
+                score = cosine(vectorize(sample["cached"]), vectorize(sample["question"]))
+                hit = score >= threshold
+            tp += hit and sample["same"]
+            fp += hit and not sample["same"]
+            fn += not hit and sample["same"]
+            if hit != sample["same"]:
+                errors.append({**sample, "score": round(score, 3)})
+        result[variant] = {
+            "precision": tp / (tp + fp) if tp + fp else None,
+            "recall": tp / (tp + fn) if tp + fn else None,
+            "false_hits": fp,
+            "errors": errors,
+        }
+    return result
+
+
+def fmt(value) -> str:
+    return f"{value:.3f}" if value is not None else "-"
+
+
+def report(samples: list, sweep: dict, args) -> bool:
+    same = sum(1 for sample in samples if sample["same"])
+    print(f"📊 {len(samples)} pares: {same} paráfrasis, {len(samples) - same} preguntas distintas\n")
+    print(f"{'umbral':>7} | {'caché: precisión':>16} {'recall':>7} {'falsos':>7} | {'n-gramas: precisión':>19} {'recall':>7} {'falsos':>7}")
+    for threshold, result in sweep.items():
+        cache, ngrams = result["cache"], result["ngrams"]
+        print(
+            f"{threshold:>7.2f} | {fmt(cache['precision']):>16} {fmt(cache['recall']):>7} {cache['false_hits']:>7} | "
+            f"{fmt(ngrams['precision']):>19} {fmt(ngrams['recall']):>7} {ngrams['false_hits']:>7}"
+        )
+
+    # Entre los umbrales con la precisión mínima y el mayor recall, el más
+    # alto: deja más margen ante preguntas que no están en las muestras
+    candidates = [
+        (result["cache"]["recall"] or 0, threshold) for threshold, result in sweep.items()
+        if result["cache"]["precision"] is not None and result["cache"]["precision"] >= args.min_precision
+    ]
+    if candidates:
+        print(f"\nUmbral recomendado (precisión >= {args.min_precision}): {max(candidates)[1]:.2f}")
+
+    selected = sweep[args.threshold]["cache"]
+    if selected["errors"]:
+        print(f"\nErrores de la caché con umbral {args.threshold}:")
+        for error in selected["errors"]:
+            kind = "falso acierto" if not error["same"] else "fallo"
+            print(f"   [{kind}, {error['score']}] {error['cached']} -> {error['question']}")
+
+    if selected["precision"] is not None and selected["precision"] < args.min_precision:
+        print(f"❌ precisión {selected['precision']:.3f} < {args.min_precision} con umbral {args.threshold}")
+        return False
+    print(f"\n✅ Precisión con umbral {args.threshold}: {fmt(selected['precision'])}, recall {fmt(selected['recall'])}")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", default=DEFAULT_SAMPLES, help="Archivo JSONL con pares etiquetados")
+    parser.add_argument("--threshold", type=float, default=SEMANTIC_CACHE_THRESHOLD, help="Umbral a comprobar")
+    parser.add_argument("--min-precision", type=float, default=1.0, help="Precisión mínima de los aciertos")
+    parser.add_argument("--json", help="Guardar el resultado en este archivo JSON")
+    args = parser.parse_args()
+
+    samples = load_samples(args.samples)
+    sweep = {threshold: scores(samples, threshold) for threshold in sorted(set(THRESHOLDS) | {args.threshold})}
+    ok = report(samples, sweep, args)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({str(threshold): result for threshold, result in sweep.items()}, f, ensure_ascii=False, indent=2)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Prueba de resistencia (soak): crecimiento de memoria por conversación y por mensaje.
+
+Hace pasar muchas conversaciones por /chat con el modelo simulado y muestrea
+periódicamente, vía /health, la memoria residente del proceso (RSS) y los
+bytes de checkpoints en memoria. Al final reporta bytes por conversación y
+por mensaje, y termina con código 1 si el crecimiento supera el presupuesto,
+para detectar regresiones en la memoria del agente antes de desplegar.
+
+Por defecto levanta la API en este mismo proceso con LLM_BACKEND=fake y el
+checkpointer configurado en el entorno (MEMORY_MAX_THREADS, etc.). Con --url
+se prueba un servidor ya corriendo, por ejemplo el contenedor de
+docker-compose iniciado con LLM_BACKEND=fake.
+
+Uso:
+    python soak_memory.py --threads 5000 --turns 4
+    MEMORY_MAX_THREADS=1000 python soak_memory.py --threads 20000 --max-tail-bytes-per-message 500
+    python soak_memory.py --url http://localhost:8000 --threads 20000 --json soak.json
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import httpx
+
+PREGUNTAS = [
+    "Hola, ¿qué seguros ofrecen?",
+    "¿Cuánto cuesta el seguro de auto?",
+    "¿Qué cubre el seguro de hogar?",
+    "¿Cómo los contacto?",
+]
+
+
+async def sample(client: httpx.AsyncClient, start: float, threads: int, messages: int, local: bool) -> dict:
+    """Lee RSS y ocupación del checkpointer desde /health."""
+    if local:
+        gc.collect()
+    health = (await client.get("/health")).json()
+    checkpointer = health.get("checkpointer") or {}
+    return {
+        "elapsed_s": round(time.perf_counter() - start, 2),
+        "threads": threads,
+        "messages": messages,
+        "rss_bytes": health["process"]["rss_bytes"],
+        "checkpoint_bytes": checkpointer.get("resident_bytes"),
+        "checkpoint_threads": checkpointer.get("threads"),
+    }
+
+
+async def drive(client: httpx.AsyncClient, first: int, count: int, args, progress: dict) -> None:
+    """Ejecuta `count` conversaciones de `args.turns` turnos con `args.concurrency` clientes."""
+    pending = iter(range(first, first + count))
+
+    async def worker():
+        for n in pending:
+            for turn in range(args.turns):
+                response = await client.post("/chat", json={
+                    "message": f"{PREGUNTAS[turn % len(PREGUNTAS)]} (cliente {n})",
+                    "thread_id": f"soak_{args.run_id}_{n}",
+                })
+                if response.status_code != 200:
+                    progress["errors"] += 1
+                progress["messages"] += 2
+            progress["threads"] += 1
+
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+
+
+def slope(samples: list, field: str) -> float:
+    """Pendiente por mínimos cuadrados de `field` respecto a los mensajes enviados."""
+    xs = [s["messages"] for s in samples]
+    ys = [s[field] for s in samples]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    den = sum((x - mean_x) ** 2 for x in xs)
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / den if den else 0.0
+
+
+async def soak(client: httpx.AsyncClient, args, local: bool) -> dict:
+    progress = {"threads": 0, "messages": 0, "errors": 0}
+    start = time.perf_counter()
+
+    # Calentamiento: imports, cachés y estructuras internas se llenan antes de medir
+    await drive(client, 0, args.warmup, args, progress)
+    base = await sample(client, start, 0, 0, local)
+    if base["rss_bytes"] is None:
+        raise SystemExit("❌ /health no reporta rss_bytes (¿servidor fuera de Linux?)")
+    warmup = dict(progress)
+    progress.update(threads=0, messages=0)
+    samples = [base]
+
+    load = asyncio.create_task(drive(client, args.warmup, args.threads, args, progress))
+    while not load.done():
+        await asyncio.wait([load], timeout=args.sample_interval)
+        samples.append(await sample(client, start, progress["threads"], progress["messages"], local))
+        last = samples[-1]
+        print(f"  {last['elapsed_s']:>7.1f} s  {last['threads']:>7} conversaciones  "
+              f"RSS {last['rss_bytes'] / 2**20:>8.1f} MB  "
+              f"checkpoints {(last['checkpoint_bytes'] or 0) / 2**20:>7.1f} MB en {last['checkpoint_threads'] or 0} hilos")
+    await load
+
+    final = samples[-1]
+    growth = final["rss_bytes"] - base["rss_bytes"]
+    # Pendiente en la segunda mitad: crecimiento sostenido (fuga) aunque haya expulsión
+    tail = samples[len(samples) // 2:]
+    result = {
+        "config": {
+            "threads": args.threads,
+            "turns": args.turns,
+            "concurrency": args.concurrency,
+            "warmup_threads": args.warmup,
+            "target": args.url or "in-process",
+        },
+        "errors": progress["errors"] + warmup["errors"],
+        "rss_base_bytes": base["rss_bytes"],
+        "rss_final_bytes": final["rss_bytes"],
+        "rss_growth_bytes": growth,
+        "rss_bytes_per_thread": growth / args.threads,
+        "rss_bytes_per_message": growth / final["messages"],
+        "rss_tail_bytes_per_message": slope(tail, "rss_bytes") if len(tail) > 1 else None,
+        "checkpoint_bytes": final["checkpoint_bytes"],
+        "checkpoint_threads": final["checkpoint_threads"],
+        "samples": samples,
+    }
+    if final["checkpoint_bytes"] and final["checkpoint_threads"]:
+        result["checkpoint_bytes_per_thread"] = final["checkpoint_bytes"] / final["checkpoint_threads"]
+        result["checkpoint_bytes_per_message"] = final["checkpoint_bytes"] / (final["checkpoint_threads"] * args.turns * 2)
+    return result
+
+
+def report(result: dict, args) -> bool:
+    print(f"\n📊 {args.threads} conversaciones x {args.turns} turnos ({result['errors']} errores)")
+    print(f"   RSS: {result['rss_base_bytes'] / 2**20:.1f} MB -> {result['rss_final_bytes'] / 2**20:.1f} MB "
+          f"(+{result['rss_growth_bytes'] / 2**20:.1f} MB)")
+    print(f"   RSS por conversación:       {result['rss_bytes_per_thread']:>10.0f} bytes")
+    print(f"   RSS por mensaje:            {result['rss_bytes_per_message']:>10.0f} bytes")
+    if result["rss_tail_bytes_per_message"] is not None:
+        print(f"   RSS por mensaje (2ª mitad): {result['rss_tail_bytes_per_message']:>10.0f} bytes")
+    if "checkpoint_bytes_per_thread" in result:
+        print(f"   Checkpoints por conversación: {result['checkpoint_bytes_per_thread']:>8.0f} bytes "
+              f"({result['checkpoint_threads']} conversaciones en memoria)")
+        print(f"   Checkpoints por mensaje:      {result['checkpoint_bytes_per_message']:>8.0f} bytes")
+
+    failures = []
+    if result["errors"]:
+        failures.append(f"{result['errors']} requests con error")
+    if args.max_bytes_per_thread and result["rss_bytes_per_thread"] > args.max_bytes_per_thread:
+        failures.append(f"RSS por conversación > {args.max_bytes_per_thread} bytes")
+    if args.max_bytes_per_message and result["rss_bytes_per_message"] > args.max_bytes_per_message:
+        failures.append(f"RSS por mensaje > {args.max_bytes_per_message} bytes")
+    tail = result["rss_tail_bytes_per_message"]
+    if args.max_tail_bytes_per_message and tail is not None and tail > args.max_tail_bytes_per_message:
+        failures.append(f"RSS por mensaje en la 2ª mitad > {args.max_tail_bytes_per_message} bytes (la memoria no se estabiliza)")
+    if args.max_rss_mb and result["rss_final_bytes"] > args.max_rss_mb * 2**20:
+        failures.append(f"RSS final > {args.max_rss_mb} MB")
+    for failure in failures:
+        print(f"❌ Presupuesto superado: {failure}")
+    if not failures:
+        print("✅ Memoria dentro del presupuesto")
+    return not failures
+
+
+async def main_async():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Probar un servidor ya corriendo en lugar de la API en proceso")
+    parser.add_argument("--threads", type=int, default=5000, help="Conversaciones a enviar (sin contar el calentamiento)")
+    parser.add_argument("--turns", type=int, default=4, help="Mensajes por conversación")
+    parser.add_argument("--concurrency", type=int, default=32, help="Clientes en paralelo")
+    parser.add_argument("--warmup", type=int, default=200, help="Conversaciones de calentamiento antes de medir")
+    parser.add_argument("--latency", type=float, default=0.0, help="Latencia del modelo simulado en proceso (s)")
+    parser.add_argument("--sample-interval", type=float, default=2.0, help="Segundos entre muestras")
+    parser.add_argument("--max-bytes-per-thread", type=float, default=65536, help="Presupuesto de RSS por conversación (0 = sin límite)")
+    parser.add_argument("--max-bytes-per-message", type=float, default=0, help="Presupuesto de RSS por mensaje (0 = sin límite)")
+    parser.add_argument("--max-tail-bytes-per-message", type=float, default=0,
+                        help="Presupuesto de crecimiento por mensaje en la 2ª mitad; con MEMORY_MAX_THREADS "
+                             "por debajo de --threads debe ser casi 0 (0 = sin límite)")
+    parser.add_argument("--max-rss-mb", type=float, default=0, help="RSS final máximo en MB (0 = sin límite)")
+    parser.add_argument("--json", help="Guardar resultado y muestras en este archivo JSON")
+    args = parser.parse_args()
+    args.run_id = f"{int(time.time())}"
+
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=60) as client:
+            result = await soak(client, args, local=False)
+    else:
+        os.environ["LLM_BACKEND"] = "fake"
+        os.environ["FAKE_LLM_LATENCY_MS"] = str(args.latency * 1000)
+        import main
+        async with main.lifespan(main.app):
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://soak", timeout=60) as client:
+                result = await soak(client, args, local=True)
+
+    ok = report(result, args)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main_async())
@@ -0,0 +1,45 @@
+"""
+Modelo con endpoint batch para el benchmark de micro-batching.
+
+Extiende el modelo simulado de la app (fake_llm.FakeChatModel) con un
+límite de peticiones simultáneas, como la cuota de un proveedor real.
+"""
+
+import asyncio
+from typing import Any, List, Optional
+
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from fake_llm import FakeChatModel
+
+
+class BatchStubChatModel(FakeChatModel):
+    """
+    Modelo con un endpoint batch y un límite de peticiones simultáneas.
+    
+    Imita un proveedor con cuota de `max_parallel_requests` peticiones en
+    curso: cada llamada individual ocupa una, y un lote ocupa una sola para
+    todos sus elementos, con `per_item_latency` extra por elemento.
+    """
+    
+    max_parallel_requests: int = 4
+    per_item_latency: float = 0.01
+    _slots: Any = None
+    
+    def _slot(self) -> asyncio.Semaphore:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_parallel_requests)
+        return self._slots
+    
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        async with self._slot():
+            await asyncio.sleep(self.sample_latency())
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages, self.answer_for(messages)))])
+    
+    async def abatch(self, inputs: List[Any], config: Any = None, *, return_exceptions: bool = False,
+                     **kwargs: Any) -> List[BaseMessage]:
+        async with self._slot():
+            await asyncio.sleep(self.sample_latency() + self.per_item_latency * len(inputs))
+        return [self._message(messages, self.answer_for(messages)) for messages in inputs]